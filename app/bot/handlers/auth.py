@@ -1,11 +1,19 @@
 from aiogram import Router, F
-from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
+from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, FSInputFile
 from aiogram.filters import Command
 from app.core.config import settings
 from app.services.user_service import user_service
 from app.services.vk_service import vk_service
+from app.services.report_service import report_service, REPORT_DAYS
+from app.services.stats_sync import stats_sync_service
+from app.services.export_service import export_service, EXPORT_FORMATS, MAX_UPLOAD_BYTES
+from app.services.chart_service import chart_service
 from app.core.database import async_session
+from app.bot.outbox import outbox
+import asyncio
 import urllib.parse
+import html
+import os
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,9 +29,53 @@ def generate_vk_auth_url(telegram_user_id: int) -> str:
         'state': str(telegram_user_id)
     }
     
-    base_url = "https://oauth.vk.com/authorize"
+    base_url = f"{settings.VK_OAUTH_URL}/authorize"
     return f"{base_url}?{urllib.parse.urlencode(params)}"
 
+def format_accounts_list(ad_accounts: list) -> str:
+    """Список аккаунтов из ответа ads.getAccounts"""
+    report_text = "📊 <b>Отчет по рекламным кампаниям</b>\n\n"
+    
+    for account in ad_accounts[:3]:  # Показываем только первые 3 аккаунта
+        account_name = account.get('account_name', 'Без названия')
+        account_id = account.get('account_id')
+        account_status = account.get('account_status', 0)
+        
+        status_emoji = "✅" if account_status == 1 else "⏸️"
+        
+        report_text += f"{status_emoji} <b>{account_name}</b>\n"
+        report_text += f"   ID: <code>{account_id}</code>\n"
+        report_text += f"   Статус: {'Активен' if account_status == 1 else 'Приостановлен'}\n\n"
+    
+    if len(ad_accounts) > 3:
+        report_text += f"... и еще {len(ad_accounts) - 3} аккаунтов\n\n"
+    
+    return report_text
+
+# Фоновые отправки графиков (ссылки держим, чтобы задачи не собрал сборщик мусора)
+_chart_tasks = set()
+
+def schedule_report_chart(callback: CallbackQuery, trend: dict):
+    """Отправка графика в фоне: обработчик не ждет отрисовку, следующие нажатия пользователя не стоят в очереди"""
+    task = asyncio.create_task(send_report_chart(callback, trend))
+    _chart_tasks.add(task)
+    task.add_done_callback(_chart_tasks.discard)
+
+async def send_report_chart(callback: CallbackQuery, trend: dict):
+    """График динамики под отчетом. Без новых данных тот же график повторно не отправляется"""
+    chat_id = callback.message.chat.id
+    path = await chart_service.render_trend(trend, f"Динамика за {REPORT_DAYS} дней")
+    if path is None or chart_service.already_sent(chat_id, path):
+        return
+    # Отмечаем до отправки: параллельные обновления отчета не пришлют ту же картинку еще раз
+    chart_service.mark_sent(chat_id, path)
+    try:
+        await outbox.send_photo(callback.bot, chat_id, FSInputFile(path, filename="report.png"))
+    except Exception as e:
+        chart_service.unmark_sent(chat_id, path)
+        # Текст отчета уже показан - без графика он остается полноценным
+        logger.error(f"Error sending report chart to {chat_id}: {e}")
+
 @router.message(Command("start"))
 async def start_handler(message: Message):
     """Приветствие и начальная настройка"""
@@ -54,7 +106,8 @@ async def connect_vk_callback(callback: CallbackQuery):
         [InlineKeyboardButton(text="🔄 Обновить статус", callback_data="check_status")]
     ])
     
-    await callback.message.edit_text(
+    await outbox.edit_text(
+        callback.message,
         "🔐 <b>Подключение VK Ads API:</b>\n\n"
         "1️⃣ Нажмите кнопку <b>\"Авторизоваться в VK\"</b>\n"
         "2️⃣ Разрешите доступ к рекламному аккаунту\n"
@@ -73,7 +126,8 @@ async def check_status_callback(callback: CallbackQuery):
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="🔗 Подключить VK", callback_data="connect_vk")]
             ])
-            await callback.message.edit_text(
+            await outbox.edit_text(
+                callback.message,
                 "📊 <b>Статус подключения:</b>\n\n"
                 "VK Ads: ❌ <i>Не подключен</i>\n"
                 "Последняя синхронизация: -\n\n"
@@ -82,27 +136,22 @@ async def check_status_callback(callback: CallbackQuery):
             )
             return
         
-        # Получаем токен и проверяем доступ
-        access_token = await user_service.get_vk_token(session, callback.from_user.id)
-        
-        # Проверяем доступ к VK API
-        user_info = await vk_service.get_user_info(access_token)
-        
-        if user_info:
-            # Получаем рекламные аккаунты
-            ad_accounts = await vk_service.get_ad_accounts(access_token)
-            accounts_count = len(ad_accounts) if ad_accounts else 0
+        # Токен проверяет фоновая задача (token_health), статус строится только из БД
+        if user.token_valid is not False:
+            accounts = await report_service.get_accounts(session, callback.from_user.id)
             
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="📈 Получить отчет", callback_data="get_report")],
                 [InlineKeyboardButton(text="🔄 Обновить", callback_data="check_status")]
             ])
             
-            await callback.message.edit_text(
+            await outbox.edit_text(
+                callback.message,
                 f"📊 <b>Статус подключения:</b>\n\n"
                 f"VK Ads: ✅ <i>Подключен</i>\n"
-                f"Пользователь: <b>{user_info.get('first_name', '')} {user_info.get('last_name', '')}</b>\n"
-                f"Рекламных аккаунтов: <b>{accounts_count}</b>\n"
+                f"Пользователь: <b>{html.escape(user.vk_name or '—')}</b>\n"
+                f"Рекламных аккаунтов: <b>{len(accounts) if accounts else 'нет данных'}</b>\n"
+                f"Токен проверен: <i>{user.token_checked_at.strftime('%d.%m.%Y %H:%M') if user.token_checked_at else 'ожидает проверки'}</i>\n"
                 f"Последняя активность: <i>{user.last_seen.strftime('%d.%m.%Y %H:%M') if user.last_seen else 'Неизвестно'}</i>\n\n"
                 f"✅ Готов к получению отчетов!",
                 reply_markup=keyboard
@@ -111,7 +160,8 @@ async def check_status_callback(callback: CallbackQuery):
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="🔗 Переподключить VK", callback_data="connect_vk")]
             ])
-            await callback.message.edit_text(
+            await outbox.edit_text(
+                callback.message,
                 "📊 <b>Статус подключения:</b>\n\n"
                 "VK Ads: ⚠️ <i>Ошибка доступа</i>\n\n"
                 "Токен доступа истек или недействителен.\n"
@@ -122,10 +172,13 @@ async def check_status_callback(callback: CallbackQuery):
 @router.callback_query(F.data == "get_report")
 async def get_report_callback(callback: CallbackQuery):
     """Получение базового отчета"""
-    await callback.message.edit_text(
+    # Промежуточный статус не ждем: если отчет готов раньше, правки схлопнутся
+    await outbox.edit_text(
+        callback.message,
         "📊 <b>Генерация отчета...</b>\n\n"
         "⏳ Получаем данные из VK Ads API...",
-        reply_markup=None
+        reply_markup=None,
+        wait=False
     )
     
     try:
@@ -136,17 +189,31 @@ async def get_report_callback(callback: CallbackQuery):
                 keyboard = InlineKeyboardMarkup(inline_keyboard=[
                     [InlineKeyboardButton(text="🔗 Подключить VK", callback_data="connect_vk")]
                 ])
-                await callback.message.edit_text(
+                await outbox.edit_text(
+                    callback.message,
                     "❌ <b>Ошибка:</b> VK аккаунт не подключен",
                     reply_markup=keyboard
                 )
                 return
             
-            # Получаем рекламные аккаунты
-            ad_accounts = await vk_service.get_ad_accounts(access_token)
+            # Отчет строится из локальной базы, которую заполняет фоновая синхронизация
+            accounts = await report_service.get_accounts(session, callback.from_user.id)
+            
+            if not accounts:
+                # Данных еще нет - запускаем синхронизацию и показываем аккаунты из VK
+                ad_accounts = await vk_service.get_ad_accounts(access_token)
+                if ad_accounts:
+                    stats_sync_service.schedule_user(callback.from_user.id, access_token)
+                    report_text = format_accounts_list(ad_accounts)
+                    report_text += "⏳ <i>Статистика загружается, обновите отчет через пару минут</i>"
+                    await outbox.edit_text(callback.message, report_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                        [InlineKeyboardButton(text="🔄 Обновить отчет", callback_data="get_report")]
+                    ]))
+                    return
             
-            if not ad_accounts:
-                await callback.message.edit_text(
+            if not accounts:
+                await outbox.edit_text(
+                    callback.message,
                     "📊 <b>Отчет по рекламным кампаниям</b>\n\n"
                     "ℹ️ Рекламные аккаунты не найдены или нет доступа.\n\n"
                     "Возможные причины:\n"
@@ -159,35 +226,27 @@ async def get_report_callback(callback: CallbackQuery):
                 )
                 return
             
-            # Формируем отчет
-            report_text = "📊 <b>Отчет по рекламным кампаниям</b>\n\n"
-            
-            for account in ad_accounts[:3]:  # Показываем только первые 3 аккаунта
-                account_name = account.get('account_name', 'Без названия')
-                account_id = account.get('account_id')
-                account_status = account.get('account_status', 0)
-                
-                status_emoji = "✅" if account_status == 1 else "⏸️"
-                
-                report_text += f"{status_emoji} <b>{account_name}</b>\n"
-                report_text += f"   ID: <code>{account_id}</code>\n"
-                report_text += f"   Статус: {'Активен' if account_status == 1 else 'Приостановлен'}\n\n"
-            
-            if len(ad_accounts) > 3:
-                report_text += f"... и еще {len(ad_accounts) - 3} аккаунтов\n\n"
-            
-            report_text += "📈 <i>Детальная статистика будет доступна в следующих версиях</i>"
+            report_text, trend = await report_service.build_report(session, accounts)
             
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [InlineKeyboardButton(text="🔄 Обновить отчет", callback_data="get_report")],
+                [
+                    InlineKeyboardButton(text="💡 Рекомендации", callback_data="recommendations"),
+                    InlineKeyboardButton(text="📥 Выгрузить", callback_data="export")
+                ],
                 [InlineKeyboardButton(text="⚙️ Настройки", callback_data="check_status")]
             ])
             
-            await callback.message.edit_text(report_text, reply_markup=keyboard)
+            await outbox.edit_text(callback.message, report_text, reply_markup=keyboard)
+        
+        # Картинка рисуется в пуле процессов уже после ответа и без соединения с базой
+        if trend is not None:
+            schedule_report_chart(callback, trend)
             
     except Exception as e:
         logger.error(f"Error generating report: {e}")
-        await callback.message.edit_text(
+        await outbox.edit_text(
+            callback.message,
             "❌ <b>Ошибка генерации отчета</b>\n\n"
             "Попробуйте позже или обратитесь в поддержку.",
             reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -195,6 +254,118 @@ async def get_report_callback(callback: CallbackQuery):
             ])
         )
 
+@router.callback_query(F.data == "recommendations")
+async def recommendations_callback(callback: CallbackQuery):
+    """Рекомендации по оптимизации кампаний"""
+    back_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⬅️ К отчету", callback_data="get_report")]
+    ])
+    try:
+        async with async_session() as session:
+            accounts = await report_service.get_accounts(session, callback.from_user.id)
+            advice = await report_service.build_recommendations_text(session, accounts) if accounts else ""
+        
+        await outbox.edit_text(
+            callback.message,
+            "💡 <b>Рекомендации по оптимизации</b>\n\n"
+            + (advice or "✅ Явных проблем в кампаниях не найдено."),
+            reply_markup=back_keyboard
+        )
+    except Exception as e:
+        logger.error(f"Error building recommendations: {e}")
+        await outbox.edit_text(
+            callback.message,
+            "❌ <b>Не удалось подготовить рекомендации</b>\n\n"
+            "Попробуйте позже.",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔄 Повторить", callback_data="recommendations")],
+                [InlineKeyboardButton(text="⬅️ К отчету", callback_data="get_report")]
+            ])
+        )
+
+@router.callback_query(F.data == "export")
+async def export_menu_callback(callback: CallbackQuery):
+    """Выбор формата выгрузки"""
+    await outbox.edit_text(
+        callback.message,
+        "📥 <b>Выгрузка статистики</b>\n\n"
+        f"Все кампании по дням за {export_service.days} дней.\n"
+        "Выберите формат файла:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="📄 CSV", callback_data="export:csv"),
+                InlineKeyboardButton(text="📊 Excel", callback_data="export:xlsx")
+            ],
+            [InlineKeyboardButton(text="⬅️ К отчету", callback_data="get_report")]
+        ])
+    )
+
+@router.callback_query(F.data.startswith("export:"))
+async def export_callback(callback: CallbackQuery):
+    """Выгрузка статистики файлом"""
+    fmt = callback.data.split(":", 1)[1]
+    if fmt not in EXPORT_FORMATS:
+        return
+    
+    back_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⬅️ К отчету", callback_data="get_report")]
+    ])
+    await outbox.edit_text(
+        callback.message,
+        "📥 <b>Выгрузка статистики</b>\n\n"
+        "⏳ Готовим файл...",
+        reply_markup=None,
+        wait=False
+    )
+    
+    try:
+        async with async_session() as session:
+            accounts = await report_service.get_accounts(session, callback.from_user.id)
+            if not accounts:
+                await outbox.edit_text(
+                    callback.message,
+                    "📥 <b>Выгрузка статистики</b>\n\n"
+                    "ℹ️ Нет загруженной статистики. Откройте отчет, чтобы запустить загрузку.",
+                    reply_markup=back_keyboard
+                )
+                return
+            # Файл строится в отдельном процессе; повторная выгрузка берется из кэша на диске
+            path, filename = await export_service.export(session, accounts, fmt)
+        
+        if os.path.getsize(path) > MAX_UPLOAD_BYTES:
+            await outbox.edit_text(
+                callback.message,
+                "📥 <b>Выгрузка статистики</b>\n\n"
+                "⚠️ Файл больше 50 МБ - Telegram не позволяет отправить его ботом.",
+                reply_markup=back_keyboard
+            )
+            return
+        
+        await outbox.send_document(
+            callback.bot,
+            callback.message.chat.id,
+            FSInputFile(path, filename=filename),
+            caption=f"📥 Статистика кампаний за {export_service.days} дней"
+        )
+        await outbox.edit_text(
+            callback.message,
+            "📥 <b>Выгрузка готова</b>\n\n"
+            "Файл отправлен отдельным сообщением.",
+            reply_markup=back_keyboard
+        )
+    
+    except Exception as e:
+        logger.error(f"Error exporting report: {e}")
+        await outbox.edit_text(
+            callback.message,
+            "❌ <b>Ошибка выгрузки</b>\n\n"
+            "Попробуйте позже или обратитесь в поддержку.",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔄 Повторить", callback_data=callback.data)],
+                [InlineKeyboardButton(text="⬅️ К отчету", callback_data="get_report")]
+            ])
+        )
+
 @router.message(Command("status"))
 async def status_handler(message: Message):
     """Команда проверки статуса"""
@@ -219,12 +390,12 @@ async def help_handler(message: Message):
 📊 <b>Функции:</b>
 • Подключение VK Ads API
 • Просмотр рекламных аккаунтов
-• Базовые отчеты по кампаниям
+• Отчеты по кампаниям: расход, CTR, CPC
+• Автоматические ежедневные отчеты
+• Рекомендации по оптимизации
 
 🚀 <b>В разработке:</b>
 • Детальная аналитика
-• Автоматические отчеты  
-• Рекомендации по оптимизации
     """
     
     await message.answer(help_text)
\ No newline at end of file
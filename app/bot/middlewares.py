@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery, TelegramObject
+from app.services.activity import activity_tracker
+from app.services.rate_limiter import RateLimiter
+from app.core.metrics import handler_duration, handler_errors
+
+logger = logging.getLogger(__name__)
+
+class ActivityMiddleware(BaseMiddleware):
+    """Отметка активности пользователя на каждом апдейте"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is not None:
+            activity_tracker.touch(user.id)
+        return await handler(event, data)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Замер длительности обработчиков (inner middleware, имя берется из найденного хендлера)"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, name)
+
+class CallbackThrottleMiddleware(BaseMiddleware):
+    """
+    Защита от частых нажатий inline кнопок (inner middleware роутера callback_query).
+    Повторное нажатие той же кнопки, пока она обрабатывается или только что обработалась,
+    не запускает обработку заново, а ждет текущую. Прочие лишние нажатия отсекает
+    token bucket пользователя - в ответ только всплывающее "подождите".
+    """
+    
+    def __init__(self, rate: float, burst: int, window: float):
+        self.rate = rate
+        self.burst = burst
+        self.window = window
+        self.limiter = RateLimiter("callback_rate")
+        # (пользователь, сообщение, callback_data) -> обработка; после завершения живет еще window сек.
+        # В режиме webhook апдейты пользователя идут по очереди, и дубль доходит до нас уже
+        # после завершения первой обработки - поэтому нужно окно, а не только выполняющиеся задачи
+        self._inflight: Dict[Tuple[int, Union[int, str, None], str], asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.throttled = 0
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, CallbackQuery) or event.data is None:
+            return await handler(event, data)
+        
+        # Одинаковые кнопки под разными сообщениями (например, "Обновить" у двух отчетов) - разные запросы
+        message_id = event.message.message_id if event.message else event.inline_message_id
+        key = (event.from_user.id, message_id, event.data)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # Обработка уже завершилась (дубль в окне) - ответ без текста, только снять "часики"
+            await self._answer(event, None if task.done() else "⏳ Подождите, запрос уже выполняется")
+            try:
+                await asyncio.shield(task)
+            except Exception:
+                # Ошибку уже обработал и учел первый вызов
+                pass
+            return None
+        
+        if not self.limiter.try_acquire(f"user:{event.from_user.id}", self.rate, self.burst):
+            self.throttled += 1
+            await self._answer(event, "⏳ Подождите немного перед следующим запросом")
+            return None
+        
+        self.started += 1
+        task = asyncio.ensure_future(handler(event, data))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._expire(key, done))
+        # shield: отмена первого вызова не должна обрывать обработку для присоединившихся дублей
+        return await asyncio.shield(task)
+    
+    def _expire(self, key: Tuple[int, Union[int, str, None], str], task: asyncio.Future):
+        def forget():
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+        
+        if self.window > 0:
+            asyncio.get_running_loop().call_later(self.window, forget)
+        else:
+            forget()
+    
+    @staticmethod
+    async def _answer(callback: CallbackQuery, text: Optional[str]):
+        try:
+            await callback.answer(text)
+        except TelegramAPIError as e:
+            # Запрос мог устареть, пока апдейт ждал в очереди
+            logger.debug(f"Callback answer failed: {e}")
+    
+    def stats(self) -> Dict[str, int]:
+        """Счетчики нажатий: обработано, присоединено к текущей обработке, отклонено лимитом"""
+        return {
+            'started': self.started,
+            'coalesced': self.coalesced,
+            'throttled': self.throttled,
+            'inflight': len(self._inflight),
+        }
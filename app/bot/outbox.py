@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InputFile, Message, InlineKeyboardMarkup
+from app.services.rate_limiter import telegram_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Повторов после RetryAfter
+MAX_SEND_ATTEMPTS = 3
+
+class _PendingEdit:
+    __slots__ = ('bot', 'text', 'reply_markup', 'digest', 'future')
+
+    def __init__(self, bot: Bot, text: str, reply_markup, digest: str, future: asyncio.Future):
+        self.bot = bot
+        self.text = text
+        self.reply_markup = reply_markup
+        self.digest = digest
+        self.future = future
+
+class MessageOutbox:
+    """
+    Очередь исходящих сообщений между обработчиками и Bot:
+    правки одного сообщения схлопываются до последней, одинаковые пропускаются,
+    отправка идет с учетом лимитов на чат и на бота.
+    """
+
+    def __init__(self, limiter=telegram_rate_limiter, max_digests: int = 50000):
+        self.limiter = limiter
+        self.max_digests = max_digests
+        self.sent = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self._pending: Dict[Tuple[int, int], _PendingEdit] = {}
+        self._digests: "OrderedDict[Tuple[int, int], str]" = OrderedDict()
+        self._tasks = set()
+
+    @staticmethod
+    def digest(text: str, reply_markup: Optional[InlineKeyboardMarkup]) -> str:
+        """Хэш содержимого сообщения: текст и клавиатура"""
+        markup = reply_markup.model_dump_json() if reply_markup is not None else ""
+        return hashlib.blake2b(f"{text}\x00{markup}".encode(), digest_size=16).hexdigest()
+
+    def _remember(self, key: Tuple[int, int], digest: str):
+        self._digests[key] = digest
+        self._digests.move_to_end(key)
+        if len(self._digests) > self.max_digests:
+            self._digests.popitem(last=False)
+
+    async def edit_text(
+        self,
+        message: Message,
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+        wait: bool = True
+    ):
+        """
+        Правка текста сообщения через очередь.
+        wait=False - не ждать отправки (для промежуточных статусов, которые
+        могут быть заменены следующей правкой).
+        """
+        key = (message.chat.id, message.message_id)
+        digest = self.digest(text, reply_markup)
+        
+        pending = self._pending.get(key)
+        if pending is not None:
+            # Предыдущая правка еще не ушла - отправим только последнюю
+            pending.text, pending.reply_markup, pending.digest = text, reply_markup, digest
+            self.coalesced += 1
+        elif self._digests.get(key) == digest:
+            self.skipped += 1
+            return
+        else:
+            future = asyncio.get_running_loop().create_future()
+            pending = _PendingEdit(message.bot, text, reply_markup, digest, future)
+            self._pending[key] = pending
+            task = asyncio.create_task(self._deliver_edit(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        
+        if wait:
+            await asyncio.shield(pending.future)
+
+    async def _deliver_edit(self, key: Tuple[int, int]):
+        pending = self._pending[key]
+        try:
+            try:
+                await self.limiter.acquire(key[0])
+            finally:
+                # Пока ждали лимит, содержимое могло обновиться - берем последнее
+                del self._pending[key]
+            
+            if self._digests.get(key) == pending.digest:
+                self.skipped += 1
+            else:
+                await self._call(
+                    pending.bot.edit_message_text,
+                    chat_id=key[0],
+                    message_id=key[1],
+                    text=pending.text,
+                    reply_markup=pending.reply_markup
+                )
+                self._remember(key, pending.digest)
+            pending.future.set_result(None)
+        except Exception as e:
+            pending.future.set_exception(e)
+            pending.future.exception()  # Ошибку получат ожидающие, если они есть
+            logger.error(f"Error editing message {key}: {e}")
+        finally:
+            # Задачу отменили (остановка бота) - ожидающие получают отмену, а не висят
+            if not pending.future.done():
+                pending.future.cancel()
+
+    async def send_message(
+        self,
+        bot: Bot,
+        chat_id: int,
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ) -> Message:
+        """Отправка нового сообщения с учетом лимитов"""
+        await self.limiter.acquire(chat_id)
+        message = await self._call(bot.send_message, chat_id=chat_id, text=text, reply_markup=reply_markup)
+        self._remember((chat_id, message.message_id), self.digest(text, reply_markup))
+        return message
+
+    async def send_document(
+        self,
+        bot: Bot,
+        chat_id: int,
+        document: InputFile,
+        caption: Optional[str] = None
+    ) -> Message:
+        """Отправка файла с учетом лимитов (файл читается с диска по частям)"""
+        await self.limiter.acquire(chat_id)
+        return await self._call(bot.send_document, chat_id=chat_id, document=document, caption=caption)
+
+    async def send_photo(
+        self,
+        bot: Bot,
+        chat_id: int,
+        photo: InputFile,
+        caption: Optional[str] = None
+    ) -> Message:
+        """Отправка картинки с учетом лимитов"""
+        await self.limiter.acquire(chat_id)
+        return await self._call(bot.send_photo, chat_id=chat_id, photo=photo, caption=caption)
+
+    async def _call(self, method, **kwargs):
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            try:
+                result = await method(**kwargs)
+                self.sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                if attempt == MAX_SEND_ATTEMPTS - 1:
+                    raise
+                logger.warning(f"Telegram flood control, retry after {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                # Содержимое уже такое же - считаем правку выполненной
+                if "message is not modified" in str(e):
+                    self.skipped += 1
+                    return None
+                raise
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики очереди"""
+        return {
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'skipped': self.skipped,
+            'pending': len(self._pending),
+        }
+
+outbox = MessageOutbox()
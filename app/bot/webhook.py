@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+logger = logging.getLogger(__name__)
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook, который сразу отвечает Telegram и кладет апдейт в очередь.
+    Апдейты обрабатывает фиксированный пул воркеров: апдейты одного пользователя
+    всегда попадают к одному воркеру и идут по порядку, разные пользователи - параллельно.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        workers: int = 32,
+        high_water: int = 2000,
+        **kwargs: Any
+    ):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.workers = workers
+        self.high_water = high_water
+        self.depth = 0
+        self.accepted = 0
+        self.shed = 0
+        self.processed = 0
+        self.failed = 0
+        self._queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(workers)]
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def register(self, app: web.Application, /, path: str, **kwargs: Any) -> None:
+        super().register(app, path=path, **kwargs)
+        app.on_startup.append(self._start_workers)
+
+    async def _start_workers(self, app: Optional[web.Application] = None):
+        if not self._worker_tasks:
+            self._worker_tasks = [
+                asyncio.create_task(self._worker(queue))
+                for queue in self._queues
+            ]
+
+    async def close(self) -> None:
+        # Даем воркерам дообработать очередь, затем останавливаем
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook queue not drained on shutdown, dropping {self.depth} updates")
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
+        await super().close()
+
+    @staticmethod
+    def shard_key(update: Dict[str, Any]) -> int:
+        """Пользователь (или чат) апдейта для выбора воркера"""
+        for key, payload in update.items():
+            if key == 'update_id' or not isinstance(payload, dict):
+                continue
+            for field in ('from', 'user', 'chat'):
+                entity = payload.get(field)
+                if isinstance(entity, dict) and 'id' in entity:
+                    return int(entity['id'])
+        return int(update.get('update_id', 0))
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if self.depth >= self.high_water:
+            # Очередь переполнена: Telegram повторит доставку позже
+            self.shed += 1
+            if self.shed % 100 == 1:
+                logger.warning(f"Webhook queue over high-water mark ({self.depth}), shedding updates")
+            return web.Response(status=503, headers={'Retry-After': '1'})
+        
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except ValueError:
+            return web.Response(status=400)
+        
+        self.depth += 1
+        self.accepted += 1
+        queue = self._queues[self.shard_key(update) % self.workers]
+        queue.put_nowait((bot, update))
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            bot, update = await queue.get()
+            try:
+                await self._background_feed_update(bot=bot, update=update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error processing update {update.get('update_id')}: {e}")
+            finally:
+                self.depth -= 1
+                queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики очереди webhook"""
+        return {
+            'depth': self.depth,
+            'accepted': self.accepted,
+            'shed': self.shed,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
@@ -0,0 +1,116 @@
+import logging
+import time
+from itertools import islice
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Sequence, Union
+from sqlalchemy import Table
+from app.core.config import settings
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+Records = Union[Iterable[Sequence[Any]], AsyncIterable[Sequence[Any]]]
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+async def _batches(records: Records, batch_size: int):
+    """Разбиение обычного или асинхронного потока записей на пачки"""
+    if hasattr(records, '__aiter__'):
+        batch = []
+        async for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    else:
+        iterator = iter(records)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            yield batch
+
+def build_merge_sql(
+    table: Table,
+    staging: str,
+    columns: List[str],
+    conflict_columns: List[str],
+    update_columns: List[str]
+) -> str:
+    """INSERT ... SELECT из staging таблицы с обновлением только изменившихся строк"""
+    column_list = ", ".join(map(_quote, columns))
+    conflict_list = ", ".join(map(_quote, conflict_columns))
+    sql = (
+        f"INSERT INTO {_quote(table.name)} ({column_list}) "
+        # При повторах ключа в потоке побеждает последняя запись
+        f"SELECT DISTINCT ON ({conflict_list}) {column_list} FROM {_quote(staging)} "
+        f"ORDER BY {conflict_list}, ctid DESC "
+        f"ON CONFLICT ({conflict_list}) "
+    )
+    if not update_columns:
+        return sql + "DO NOTHING"
+    
+    assignments = ", ".join(f"{_quote(column)} = EXCLUDED.{_quote(column)}" for column in update_columns)
+    # updated_at меняется вместе с данными и не считается изменением сам по себе
+    compared = [column for column in update_columns if column != 'updated_at'] or update_columns
+    current = ", ".join(f"{_quote(table.name)}.{_quote(column)}" for column in compared)
+    excluded = ", ".join(f"EXCLUDED.{_quote(column)}" for column in compared)
+    return sql + f"DO UPDATE SET {assignments} WHERE ROW({current}) IS DISTINCT FROM ROW({excluded})"
+
+async def bulk_upsert(
+    table: Table,
+    columns: List[str],
+    records: Records,
+    conflict_columns: List[str],
+    update_columns: Optional[List[str]] = None,
+    batch_size: Optional[int] = None
+) -> Dict[str, float]:
+    """
+    Потоковая загрузка записей через COPY во временную таблицу
+    и слияние с целевой одним INSERT ... ON CONFLICT.
+    Записи - кортежи значений в порядке columns.
+    """
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+    unknown = set(columns) - set(table.c.keys())
+    if unknown:
+        raise ValueError(f"Unknown columns for {table.name}: {sorted(unknown)}")
+    if update_columns is None:
+        update_columns = [column for column in columns if column not in conflict_columns]
+    
+    staging = f"_staging_{table.name}"
+    started = time.perf_counter()
+    copied = 0
+    
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        pg = raw.driver_connection
+        async with pg.transaction():
+            await pg.execute(
+                f"CREATE TEMP TABLE {_quote(staging)} "
+                f"(LIKE {_quote(table.name)} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            async for batch in _batches(records, batch_size):
+                await pg.copy_records_to_table(staging, records=batch, columns=columns)
+                copied += len(batch)
+            
+            merged = 0
+            if copied:
+                status = await pg.execute(
+                    build_merge_sql(table, staging, columns, conflict_columns, update_columns)
+                )
+                merged = int(status.rsplit(" ", 1)[-1])
+    
+    seconds = time.perf_counter() - started
+    result = {
+        'rows': copied,
+        'merged': merged,
+        'seconds': seconds,
+        'rows_per_second': copied / seconds if seconds else 0.0,
+    }
+    logger.info(
+        f"Bulk upsert {table.name}: {copied} rows ({merged} changed) "
+        f"in {seconds:.2f}s, {result['rows_per_second']:.0f} rows/s"
+    )
+    return result
@@ -6,18 +6,65 @@ load_dotenv()
 class Settings:
     # Telegram
     BOT_TOKEN: str = os.getenv("BOT_TOKEN")
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "")  # Свой Bot API сервер (пусто - api.telegram.org)
     
     # VK App
     VK_APP_ID: str = os.getenv("VK_APP_ID")
     VK_APP_SECRET: str = os.getenv("VK_APP_SECRET") 
     VK_REDIRECT_URI: str = os.getenv("VK_REDIRECT_URI")
+    VK_API_URL: str = os.getenv("VK_API_URL", "https://api.vk.com/method")
+    VK_OAUTH_URL: str = os.getenv("VK_OAUTH_URL", "https://oauth.vk.com")
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    DB_POOL_MODE: str = os.getenv("DB_POOL_MODE", "queue")  # queue | null
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Ожидание соединения из пула, сек
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))  # Кэш prepared statements asyncpg
+    BULK_BATCH_SIZE: int = int(os.getenv("BULK_BATCH_SIZE", "5000"))  # Строк в одном COPY
     
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     
+    # Кэш пользователей и токенов
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL: int = int(os.getenv("USER_CACHE_TTL", "300"))
+    USER_CACHE_NOTIFY: bool = os.getenv("USER_CACHE_NOTIFY", "True").lower() == "true"  # Сброс через LISTEN/NOTIFY
+    ACTIVITY_FLUSH_INTERVAL: float = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))  # Запись last_seen пачками, сек
+    
+    # Синхронизация статистики
+    STATS_SYNC_INTERVAL_MINUTES: int = int(os.getenv("STATS_SYNC_INTERVAL_MINUTES", "60"))
+    STATS_SYNC_BACKFILL_DAYS: int = int(os.getenv("STATS_SYNC_BACKFILL_DAYS", "90"))  # Глубина первой загрузки
+    STATS_SYNC_LOOKBACK_DAYS: int = int(os.getenv("STATS_SYNC_LOOKBACK_DAYS", "2"))  # Повторная загрузка последних дней
+    STATS_SYNC_CONCURRENCY: int = int(os.getenv("STATS_SYNC_CONCURRENCY", "5"))
+    
+    # Ежедневная рассылка отчетов
+    DAILY_REPORT_HOUR: int = int(os.getenv("DAILY_REPORT_HOUR", "6"))  # Час запуска, UTC
+    DAILY_REPORT_WORKERS: int = int(os.getenv("DAILY_REPORT_WORKERS", "20"))
+    DAILY_REPORT_BATCH_SIZE: int = int(os.getenv("DAILY_REPORT_BATCH_SIZE", "500"))
+    DAILY_REPORT_RECOMMENDATIONS: int = int(os.getenv("DAILY_REPORT_RECOMMENDATIONS", "3"))  # Рекомендаций в отчете, 0 - без них
+    
+    # Фоновая проверка VK токенов
+    TOKEN_CHECK_INTERVAL_MINUTES: int = int(os.getenv("TOKEN_CHECK_INTERVAL_MINUTES", "60"))
+    TOKEN_CHECK_MAX_AGE_HOURS: float = float(os.getenv("TOKEN_CHECK_MAX_AGE_HOURS", "12"))  # Реже токен не перепроверяется
+    TOKEN_CHECK_RATE: float = float(os.getenv("TOKEN_CHECK_RATE", "5"))  # Проверок в секунду, часть общего лимита VK
+    TOKEN_CHECK_BATCH_SIZE: int = int(os.getenv("TOKEN_CHECK_BATCH_SIZE", "200"))
+    
+    # Выгрузка статистики файлом
+    EXPORT_DIR: str = os.getenv("EXPORT_DIR", "exports")  # Кэш готовых файлов на диске
+    EXPORT_CACHE_MAX_MB: int = int(os.getenv("EXPORT_CACHE_MAX_MB", "500"))
+    EXPORT_WORKERS: int = int(os.getenv("EXPORT_WORKERS", "2"))  # Процессов генерации файлов
+    EXPORT_DAYS: int = int(os.getenv("EXPORT_DAYS", "30"))
+    
+    # Графики в отчете
+    CHART_ENABLED: bool = os.getenv("CHART_ENABLED", "True").lower() == "true"
+    CHART_DIR: str = os.getenv("CHART_DIR", "charts")  # Кэш готовых картинок на диске
+    CHART_CACHE_MAX_MB: int = int(os.getenv("CHART_CACHE_MAX_MB", "100"))
+    CHART_WORKERS: int = int(os.getenv("CHART_WORKERS", "2"))  # Процессов отрисовки
+    CHART_RENDER_TIMEOUT: float = float(os.getenv("CHART_RENDER_TIMEOUT", "10"))  # На один график, сек
+    
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     
@@ -25,9 +72,62 @@ class Settings:
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     
+    # Логирование
+    LOG_FILE: str = os.getenv("LOG_FILE", "bot.log")  # Пусто - только stdout
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # text | json
+    LOG_ROTATION: str = os.getenv("LOG_ROTATION", "size")  # size | time | none
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+    LOG_ROTATE_WHEN: str = os.getenv("LOG_ROTATE_WHEN", "midnight")  # Для LOG_ROTATION=time
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # При переполнении записи отбрасываются
+    LOG_RATE_LIMIT: int = int(os.getenv("LOG_RATE_LIMIT", "20"))  # Записей WARNING+ из одного места за интервал, 0 - без ограничения
+    LOG_RATE_INTERVAL: float = float(os.getenv("LOG_RATE_INTERVAL", "60"))
+    
+    # Веб-сервер
+    WEB_HOST: str = os.getenv("WEB_HOST", "0.0.0.0")
+    WEB_PORT: int = int(os.getenv("WEB_PORT", "8000"))
+    WEB_WORKERS: int = int(os.getenv("WEB_WORKERS", "1"))  # >1 - несколько процессов на одном порту (SO_REUSEPORT)
+    FSM_STORAGE: str = os.getenv("FSM_STORAGE", "memory")  # memory | redis
+    METRICS_DIR: str = os.getenv("METRICS_DIR", "metrics")  # Снимки метрик воркеров, из которых любой воркер собирает /metrics
+    METRICS_INTERVAL: float = float(os.getenv("METRICS_INTERVAL", "5"))  # Как часто воркер обновляет свой снимок, сек
+    
+    # Webhook
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "32"))  # Воркеров обработки апдейтов
+    WEBHOOK_QUEUE_HIGH_WATER: int = int(os.getenv("WEBHOOK_QUEUE_HIGH_WATER", "2000"))  # Выше - отказ с 503
+    
+    # Нажатия inline кнопок
+    CALLBACK_RATE: float = float(os.getenv("CALLBACK_RATE", "0.5"))  # Нажатий в секунду на пользователя
+    CALLBACK_BURST: int = int(os.getenv("CALLBACK_BURST", "3"))  # Нажатий подряд без ожидания
+    CALLBACK_COALESCE_WINDOW: float = float(os.getenv("CALLBACK_COALESCE_WINDOW", "1"))  # Сек после завершения, когда повтор считается дублем
+    
     # API limits
-    VK_API_REQUESTS_PER_SECOND: int = int(os.getenv("VK_API_REQUESTS_PER_SECOND", "3"))
+    VK_API_REQUESTS_PER_SECOND: int = int(os.getenv("VK_API_REQUESTS_PER_SECOND", "3"))  # На один токен
+    VK_API_GLOBAL_REQUESTS_PER_SECOND: int = int(os.getenv("VK_API_GLOBAL_REQUESTS_PER_SECOND", "20"))  # На все приложение
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | redis
+    TELEGRAM_GLOBAL_RATE: float = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))  # Сообщений в секунду на бота (лимит ~30)
+    TELEGRAM_CHAT_RATE: float = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))  # Сообщений в секунду в один чат
+    VK_BATCHING: bool = os.getenv("VK_BATCHING", "True").lower() == "true"  # Объединение вызовов в execute
+    VK_BATCH_WINDOW: float = float(os.getenv("VK_BATCH_WINDOW", "0.01"))  # Окно сбора вызовов, сек
+    VK_PREFETCH_PAGES: int = int(os.getenv("VK_PREFETCH_PAGES", "1"))  # Страниц, загружаемых заранее при потоковой выборке
     CACHE_TTL: int = int(os.getenv("CACHE_TTL", "3600"))  # 1 час
+    
+    # HTTP клиент VK
+    VK_HTTP_LIMIT: int = int(os.getenv("VK_HTTP_LIMIT", "100"))  # Соединений всего
+    VK_HTTP_LIMIT_PER_HOST: int = int(os.getenv("VK_HTTP_LIMIT_PER_HOST", "30"))
+    VK_HTTP_TIMEOUT: float = float(os.getenv("VK_HTTP_TIMEOUT", "30"))  # Весь запрос, сек
+    VK_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("VK_HTTP_CONNECT_TIMEOUT", "5"))
+    VK_HTTP_KEEPALIVE: float = float(os.getenv("VK_HTTP_KEEPALIVE", "30"))  # Простой keep-alive соединения, сек
+    VK_DNS_CACHE_TTL: int = int(os.getenv("VK_DNS_CACHE_TTL", "300"))
+    VK_RETRIES: int = int(os.getenv("VK_RETRIES", "3"))  # Повторов при ошибках 6/9/10 и 5xx
+    VK_RETRY_BACKOFF: float = float(os.getenv("VK_RETRY_BACKOFF", "0.5"))  # Базовая задержка, сек (растет x2, со случайным разбросом)
+    VK_BREAKER_THRESHOLD: int = int(os.getenv("VK_BREAKER_THRESHOLD", "10"))  # Ошибок подряд до размыкания
+    VK_BREAKER_COOLDOWN: float = float(os.getenv("VK_BREAKER_COOLDOWN", "30"))  # Сек до пробного запроса
+    
+    # Кэш ответов VK API
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")  # memory | redis
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    VK_CACHE_TTLS: str = os.getenv("VK_CACHE_TTLS", "")  # Например: users.get=300,ads.getAccounts=600
 
     def validate(self):
         """Валидация обязательных настроек"""
@@ -1,16 +1,93 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import time
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+
+class PoolMetrics:
+    """Счетчики выдачи соединений из пула"""
+    
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+    
+    def record_wait(self, seconds: float):
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+    
+    def attach(self, engine: AsyncEngine):
+        """Подписка на события пула движка"""
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+    
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+    
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+    
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.checkins += 1
+
+pool_metrics = PoolMetrics()
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений с замером времени ожидания свободного соединения"""
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+def build_engine(pool_mode: Optional[str] = None, url: Optional[str] = None) -> AsyncEngine:
+    """Создание асинхронного движка с пулом соединений по настройкам"""
+    pool_mode = pool_mode or settings.DB_POOL_MODE
+    url = url or settings.DATABASE_URL
+    
+    options = {
+        'echo': False,  # Отключено логирование SQL
+        'pool_pre_ping': True,  # Проверка соединений
+        'pool_recycle': settings.DB_POOL_RECYCLE,  # Пересоздание соединений
+    }
+    if pool_mode == "null":
+        # Новое соединение на каждую сессию (для одноразовых скриптов)
+        options['poolclass'] = NullPool
+    else:
+        options.update(
+            poolclass=MeteredQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    
+    if url.startswith("postgresql+asyncpg"):
+        # Кэш prepared statements: на уровне SQLAlchemy и самого asyncpg
+        options['connect_args'] = {
+            'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+            'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    
+    return create_async_engine(url, **options)
 
 # Создание асинхронного движка для продакшена
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=False,  # Отключено логирование SQL
-    poolclass=NullPool,  # Отключаем пулинг для Celery задач
-    pool_pre_ping=True,  # Проверка соединений
-    pool_recycle=3600,  # Пересоздание соединений каждый час
-)
+engine = build_engine()
+pool_metrics.attach(engine)
+instrument_engine(engine)
 
 # Фабрика сессий
 async_session = sessionmaker(
@@ -29,12 +106,26 @@ async def get_session() -> AsyncSession:
         finally:
             await session.close()
 
-# Создание таблиц
-async def create_tables():
-    from app.models.user import Base
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+# Статистика пула соединений
+def get_pool_stats() -> Dict[str, float]:
+    pool = engine.pool
+    stats = {
+        'connects': pool_metrics.connects,
+        'checkouts': pool_metrics.checkouts,
+        'checkins': pool_metrics.checkins,
+        'timeouts': pool_metrics.timeouts,
+        'wait_total_seconds': round(pool_metrics.wait_total, 6),
+        'wait_max_seconds': round(pool_metrics.wait_max, 6),
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    return stats
 
 # Закрытие подключений при завершении
 async def close_db():
-    await engine.dispose()
\ No newline at end of file
+    await engine.dispose()
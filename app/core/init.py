@@ -3,14 +3,18 @@
 """
 
 from .config import settings
-from .database import get_session, create_tables, close_db
+from .database import get_session, close_db, get_pool_stats
+from .migrations import migrate
 from .security import encrypt_token, decrypt_token
+from .metrics import registry
 
 __all__ = [
     'settings',
     'get_session',
-    'create_tables',
+    'migrate',
     'close_db',
+    'get_pool_stats',
     'encrypt_token',
-    'decrypt_token'
+    'decrypt_token',
+    'registry'
 ]
\ No newline at end of file
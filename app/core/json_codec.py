@@ -0,0 +1,30 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Имя используемой реализации - для логов и бенчмарков
+BACKEND = "orjson" if orjson is not None else "json"
+# Как и json.dumps, приводим нестроковые ключи словаря к строкам
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Разбор JSON прямо из байт ответа, без промежуточной строки"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_bytes(value: Any) -> bytes:
+    """JSON в UTF-8 байтах (для Redis и HTTP тел)"""
+    if orjson is not None:
+        return orjson.dumps(value, option=_ORJSON_OPTIONS)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def dumps(value: Any) -> str:
+    """JSON строкой, без экранирования кириллицы"""
+    if orjson is not None:
+        return orjson.dumps(value, option=_ORJSON_OPTIONS).decode('utf-8')
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
@@ -0,0 +1,172 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import registry
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Передача записей в поток слушателя без форматирования и без ожидания"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Только подстановка аргументов; форматирование и трассировки - в потоке слушателя
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Диск не успевает - теряем запись, но не блокируем event loop
+            self.dropped += 1
+
+class RateLimitFilter(logging.Filter):
+    """Не больше limit записей за interval сек из одного места в коде (для WARNING и выше)"""
+
+    def __init__(self, limit: int, interval: float, level: int = logging.WARNING):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.level = level
+        self.suppressed = 0
+        # (файл, строка) -> [начало окна, записей в окне, подавлено в окне]
+        self._windows: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (подавлено повторов: {suppressed})"
+                return True
+            if window[1] < self.limit:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - один JSON объект в строке"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+        }
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+def create_file_handler(path: str) -> logging.Handler:
+    """Файловый обработчик с ротацией по размеру или по времени"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # delay: файл открывается при первой записи, а не при настройке
+    if settings.LOG_ROTATION == "size":
+        return RotatingFileHandler(
+            path,
+            maxBytes=settings.LOG_MAX_BYTES,
+            backupCount=settings.LOG_BACKUP_COUNT,
+            encoding='utf-8',
+            delay=True
+        )
+    if settings.LOG_ROTATION == "time":
+        return TimedRotatingFileHandler(
+            path,
+            when=settings.LOG_ROTATE_WHEN,
+            backupCount=settings.LOG_BACKUP_COUNT,
+            encoding='utf-8',
+            delay=True,
+            utc=True
+        )
+    return logging.FileHandler(path, encoding='utf-8', delay=True)
+
+def worker_log_file(index: int) -> str:
+    """bot.log -> bot.worker1.log"""
+    if not settings.LOG_FILE:
+        return ""
+    root, ext = os.path.splitext(settings.LOG_FILE)
+    return f"{root}.worker{index}{ext}"
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_rate_filter: Optional[RateLimitFilter] = None
+
+def setup_logging(log_file: Optional[str] = None):
+    """Логирование через очередь: в event loop только постановка записи, запись в файл - в отдельном потоке"""
+    global _listener, _queue_handler, _rate_filter
+    stop_logging()
+
+    if settings.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = settings.LOG_FILE if log_file is None else log_file
+    if log_file:
+        handlers.append(create_file_handler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    _rate_filter = None
+    if settings.LOG_RATE_LIMIT > 0:
+        _rate_filter = RateLimitFilter(settings.LOG_RATE_LIMIT, settings.LOG_RATE_INTERVAL)
+        _queue_handler.addFilter(_rate_filter)
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(getattr(logging, settings.LOG_LEVEL))
+
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    """Дописать очередь и закрыть файлы"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+def get_logging_stats() -> Dict[str, int]:
+    """Потерянные при переполнении очереди и подавленные фильтром записи"""
+    return {
+        'queued': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped': _queue_handler.dropped if _queue_handler else 0,
+        'suppressed': _rate_filter.suppressed if _rate_filter else 0,
+    }
+
+atexit.register(stop_logging)
+registry.register_stats("logging", "Очередь логирования", get_logging_stats)
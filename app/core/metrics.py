@@ -0,0 +1,325 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from app.core import json_codec
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, сек
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Снимок другого воркера старше этого числа интервалов записи - воркер не работает
+STALE_INTERVALS = 3
+
+# Семейство метрик: имя, описание, тип, строки значений
+Family = Tuple[str, str, str, List[str]]
+
+def _format_labels(names: Sequence[str], values: Sequence[str], *extra: str) -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(names, values)
+    ]
+    pairs.extend(label for label in extra if label)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Счетчик с метками"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+    
+    def inc(self, *label_values, amount: float = 1.0):
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+    
+    def render(self, extra: str = "") -> Iterable[str]:
+        for label_values, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labels, label_values, extra)} {value}"
+
+class Gauge(Counter):
+    """Значение, которое может расти и уменьшаться"""
+    
+    kind = "gauge"
+    
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+    
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # метки -> [счетчики корзин..., +Inf], сумма
+        self._values: Dict[Tuple, list] = {}
+    
+    def observe(self, value: float, *label_values):
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+    
+    def render(self, extra: str = "") -> Iterable[str]:
+        for label_values, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_label = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, extra, bucket_label)} {cumulative}"
+            cumulative += counts[-1]
+            inf_labels = _format_labels(self.labels, label_values, extra, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values, extra)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values, extra)} {cumulative}"
+
+class MetricsRegistry:
+    """Реестр метрик с выводом в текстовом формате Prometheus"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: Dict[str, Tuple[str, Callable[[], Dict]]] = {}
+    
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+    
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+    
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+    
+    def register_stats(self, prefix: str, help_text: str, stats: Callable[[], Dict[str, float]]):
+        """Счетчики из stats() компонента: каждый ключ - gauge prefix_key, читается при выгрузке"""
+        self._collectors[prefix] = (help_text, stats)
+    
+    def families(self, extra: str = "") -> List[Family]:
+        """Все метрики процесса; extra - метка, добавляемая к каждому значению (например, worker="1")"""
+        families = [
+            (metric.name, metric.help, metric.kind, list(metric.render(extra)))
+            for metric in self._metrics.values()
+        ]
+        labels = _format_labels((), (), extra)
+        for prefix, (help_text, stats) in self._collectors.items():
+            for key, value in _flatten(stats()):
+                name = f"{prefix}_{key}"
+                families.append((name, help_text, "gauge", [f"{name}{labels} {float(value)}"]))
+        return families
+    
+    def render(self) -> str:
+        return render_families(self.families())
+
+def render_families(*sources: Iterable[Family]) -> str:
+    """Текстовый формат Prometheus; одноименные семейства из разных источников выводятся вместе"""
+    merged: Dict[str, list] = {}
+    for families in sources:
+        for name, help_text, kind, samples in families:
+            entry = merged.setdefault(name, [help_text, kind, []])
+            entry[2].extend(samples)
+    lines = []
+    for name, (help_text, kind, samples) in merged.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+def _flatten(stats: Dict, prefix: str = "") -> Iterable[Tuple[str, float]]:
+    for key, value in stats.items():
+        name = f"{prefix}{key}".replace(".", "_").replace("-", "_")
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+registry = MetricsRegistry()
+
+class WorkerMetrics:
+    """
+    Метрики в многопроцессном режиме (WEB_WORKERS > 1). Запрос /metrics попадает в случайный воркер,
+    поэтому каждый воркер раз в interval сек пишет снимок своих метрик с меткой worker в общий каталог,
+    а отвечает свежими метриками своего процесса вместе со снимками остальных.
+    """
+    
+    def __init__(self, directory: str, interval: float = 5.0):
+        self.directory = directory
+        self.interval = interval
+        self.worker: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def label(self) -> str:
+        return f'worker="{self.worker}"'
+    
+    def _path(self, worker: int) -> str:
+        return os.path.join(self.directory, f"worker{worker}.json")
+    
+    async def start(self, worker: int):
+        """Запуск записи снимков воркера с номером worker"""
+        self.worker = worker
+        os.makedirs(self.directory, exist_ok=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.worker is not None:
+            # Перезапущенный воркер начнет счетчики с нуля - старый снимок не нужен
+            try:
+                os.remove(self._path(self.worker))
+            except FileNotFoundError:
+                pass
+    
+    async def _run(self):
+        while True:
+            # Метрики собираются в event loop (stats() компонентов не потокобезопасны), пишутся в потоке
+            payload = json_codec.dumps_bytes(registry.families(self.label))
+            try:
+                await asyncio.to_thread(self._write, payload)
+            except OSError as e:
+                logger.warning(f"Metrics snapshot write error: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def _write(self, payload: bytes):
+        path = self._path(self.worker)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(payload)
+        # Читатель видит либо старый, либо новый снимок целиком
+        os.replace(temp_path, path)
+    
+    def _read_others(self) -> List[List[Family]]:
+        own = os.path.basename(self._path(self.worker))
+        stale_before = time.time() - self.interval * STALE_INTERVALS
+        snapshots = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json") or name == own:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < stale_before:
+                    continue
+                with open(path, 'rb') as file:
+                    snapshots.append(json_codec.loads(file.read()))
+            except (OSError, ValueError):
+                # Воркер остановился и удалил снимок, пока мы читали каталог
+                continue
+        return snapshots
+    
+    async def render(self) -> str:
+        """Метрики всех воркеров; в однопроцессном режиме - только своего процесса, без метки"""
+        if self.worker is None:
+            return registry.render()
+        own = registry.families(self.label)
+        others = await asyncio.to_thread(self._read_others)
+        return render_families(own, *others)
+
+worker_metrics = WorkerMetrics(settings.METRICS_DIR, settings.METRICS_INTERVAL)
+
+# Общие метрики приложения
+vk_request_duration = registry.histogram(
+    "vk_request_duration_seconds", "Длительность запросов к VK API", ["method"]
+)
+vk_request_errors = registry.counter(
+    "vk_request_errors_total", "Ошибки запросов к VK API по коду", ["method", "code"]
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Длительность запросов к БД", ["statement"]
+)
+db_query_errors = registry.counter(
+    "db_query_errors_total", "Ошибки запросов к БД", ["statement"]
+)
+handler_duration = registry.histogram(
+    "bot_handler_duration_seconds", "Длительность обработчиков бота", ["handler"]
+)
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках бота", ["handler"]
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Задержка срабатывания таймера event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+class LoopLagMonitor:
+    """Замер задержки event loop: насколько позже срока просыпается таймер"""
+    
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self, *_):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self, *_):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            event_loop_lag.observe(max(0.0, time.perf_counter() - expected))
+
+loop_lag_monitor = LoopLagMonitor()
+
+def statement_type(statement: str) -> str:
+    """Тип SQL запроса для метки: SELECT, INSERT, ..."""
+    head = statement.lstrip()[:16].split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+def instrument_engine(engine):
+    """Замер длительности запросов через события SQLAlchemy"""
+    sync_engine = engine.sync_engine
+    
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+    
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is not None:
+            db_query_duration.observe(time.perf_counter() - started, statement_type(statement))
+    
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        db_query_errors.inc(statement_type(exception_context.statement or ""))
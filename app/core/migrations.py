@@ -0,0 +1,89 @@
+import logging
+import time
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_xact_lock: одновременно миграции применяет только один процесс
+MIGRATION_LOCK_KEY = 7_300_501
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[AsyncConnection], Awaitable[None]]
+
+async def _baseline(conn: AsyncConnection):
+    # Модели импортируются только при реальной миграции, а не на каждом старте
+    from app.models.user import Base
+    import app.models.statistics  # noqa: F401 - регистрация таблиц статистики
+    import app.models.report_run  # noqa: F401
+    # Для существующих баз create_all ничего не меняет и только фиксирует версию
+    await conn.run_sync(Base.metadata.create_all)
+
+async def _user_indexes(conn: AsyncConnection):
+    # Поиск по vk_user_id, выборка активных пользователей и свежей активности
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_vk_user_id ON users (vk_user_id)"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_active_last_seen ON users (is_active, last_seen)"))
+    # Рассылка и синхронизация идут по подключенным пользователям в порядке user_id
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_connected ON users (user_id) "
+        "WHERE is_active AND vk_access_token IS NOT NULL"
+    ))
+
+async def _token_health(conn: AsyncConnection):
+    # Состояние токена пишет фоновая проверка (app.services.token_health)
+    await conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS vk_name VARCHAR(200)"))
+    await conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS token_valid BOOLEAN"))
+    await conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS token_checked_at TIMESTAMP"))
+
+# Новые миграции добавляются в конец. Модели уже содержат итоговую схему, поэтому на пустой
+# базе baseline создает все сразу, и изменения должны быть идемпотентными (IF NOT EXISTS)
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", _baseline),
+    Migration(2, "user_indexes", _user_indexes),
+    Migration(3, "token_health", _token_health),
+]
+
+async def _current_version(conn: AsyncConnection) -> int:
+    exists = await conn.scalar(text("SELECT to_regclass('schema_version') IS NOT NULL"))
+    if not exists:
+        return 0
+    return await conn.scalar(text("SELECT coalesce(max(version), 0) FROM schema_version"))
+
+async def migrate(engine: Optional[AsyncEngine] = None) -> int:
+    """Применение недостающих миграций; если схема актуальна - только проверка версии"""
+    if engine is None:
+        from app.core.database import engine
+
+    latest = MIGRATIONS[-1].version
+    started = time.perf_counter()
+    async with engine.connect() as conn:
+        current = await _current_version(conn)
+    if current >= latest:
+        logger.info(f"Схема БД актуальна (версия {current}), проверка {time.perf_counter() - started:.3f}s")
+        return current
+
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, "
+            "name VARCHAR(100) NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'))"
+        ))
+        # Пока ждали блокировку, миграции мог применить другой процесс
+        current = await _current_version(conn)
+        pending = [migration for migration in MIGRATIONS if migration.version > current]
+        for migration in pending:
+            await migration.apply(conn)
+            await conn.execute(
+                text("INSERT INTO schema_version (version, name) VALUES (:version, :name)"),
+                {'version': migration.version, 'name': migration.name}
+            )
+            logger.info(f"Миграция {migration.version} ({migration.name}) применена")
+
+    if pending:
+        logger.info(f"Схема БД обновлена до версии {latest} за {time.perf_counter() - started:.3f}s")
+    return latest
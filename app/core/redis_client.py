@@ -0,0 +1,21 @@
+import logging
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis = None
+
+def get_redis():
+    """Получение общего клиента Redis (создается лениво)"""
+    global _redis
+    if _redis is None:
+        from redis import asyncio as aioredis
+        _redis = aioredis.from_url(settings.REDIS_URL)
+    return _redis
+
+async def close_redis():
+    """Закрытие подключения к Redis"""
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
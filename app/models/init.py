@@ -3,8 +3,15 @@
 """
 
 from .user import User, Base
+from .statistics import AdAccount, Campaign, CampaignStat, SyncState
+from .report_run import ReportRun
 
 __all__ = [
     'User',
-    'Base'
+    'Base',
+    'AdAccount',
+    'Campaign',
+    'CampaignStat',
+    'SyncState',
+    'ReportRun'
 ]
\ No newline at end of file
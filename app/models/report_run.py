@@ -0,0 +1,19 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Date, DateTime
+from datetime import datetime
+from app.models.user import Base
+
+class ReportRun(Base):
+    """Прогресс ежедневной рассылки отчетов (для продолжения после сбоя)"""
+    __tablename__ = "report_runs"
+    
+    run_date = Column(Date, primary_key=True)
+    status = Column(String(16), default="running")  # running | done
+    last_user_id = Column(BigInteger, default=0)  # Все пользователи до него обработаны
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    skipped = Column(Integer, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<ReportRun(run_date={self.run_date}, status={self.status})>"
@@ -0,0 +1,65 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Date, DateTime, Numeric, Index
+from datetime import datetime
+from app.models.user import Base
+
+class AdAccount(Base):
+    """Рекламный аккаунт VK, доступный пользователю"""
+    __tablename__ = "ad_accounts"
+    
+    user_id = Column(BigInteger, primary_key=True)  # Telegram user_id
+    account_id = Column(BigInteger, primary_key=True)
+    account_name = Column(String(255), nullable=True)
+    account_type = Column(String(32), nullable=True)  # general | agency
+    account_status = Column(Integer, default=0)
+    access_role = Column(String(32), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<AdAccount(account_id={self.account_id}, user_id={self.user_id})>"
+
+class Campaign(Base):
+    """Рекламная кампания"""
+    __tablename__ = "campaigns"
+    
+    campaign_id = Column(BigInteger, primary_key=True)
+    account_id = Column(BigInteger, nullable=False, index=True)
+    client_id = Column(BigInteger, nullable=True)  # Для агентских аккаунтов
+    name = Column(String(255), nullable=True)
+    status = Column(Integer, default=0)
+    day_limit = Column(Numeric(14, 2), nullable=True)  # Дневной лимит, руб
+    all_limit = Column(Numeric(14, 2), nullable=True)  # Общий лимит, руб
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<Campaign(campaign_id={self.campaign_id}, account_id={self.account_id})>"
+
+class CampaignStat(Base):
+    """Статистика кампании за день"""
+    __tablename__ = "campaign_stats"
+    __table_args__ = (
+        Index("ix_campaign_stats_account_day", "account_id", "day"),
+    )
+    
+    campaign_id = Column(BigInteger, primary_key=True)
+    day = Column(Date, primary_key=True)
+    account_id = Column(BigInteger, nullable=False)
+    impressions = Column(BigInteger, default=0)
+    clicks = Column(BigInteger, default=0)
+    reach = Column(BigInteger, default=0)
+    conversions = Column(BigInteger, default=0)
+    spent = Column(Numeric(14, 2), default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<CampaignStat(campaign_id={self.campaign_id}, day={self.day})>"
+
+class SyncState(Base):
+    """Отметка синхронизации статистики аккаунта"""
+    __tablename__ = "sync_state"
+    
+    account_id = Column(BigInteger, primary_key=True)
+    synced_until = Column(Date, nullable=True)  # Последний загруженный день
+    last_run_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<SyncState(account_id={self.account_id}, synced_until={self.synced_until})>"
@@ -13,6 +13,9 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_seen = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    vk_name = Column(String(200), nullable=True)  # Имя в VK на момент последней проверки токена
+    token_valid = Column(Boolean, nullable=True)  # None - еще не проверялся, False - токен отозван
+    token_checked_at = Column(DateTime, nullable=True)
     
     def __repr__(self):
         return f"<User(user_id={self.user_id}, vk_user_id={self.vk_user_id})>"
\ No newline at end of file
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.database import async_session
+from app.services.user_service import user_cache
+
+logger = logging.getLogger(__name__)
+
+# Одно обновление на всю пачку; last_seen не откатывается назад
+_FLUSH_SQL = text("""
+    UPDATE users
+    SET last_seen = GREATEST(users.last_seen, v.last_seen)
+    FROM unnest(CAST(:user_ids AS BIGINT[]), CAST(:last_seen AS TIMESTAMP[])) AS v(user_id, last_seen)
+    WHERE users.user_id = v.user_id
+""")
+
+class ActivityTracker:
+    """Отложенная запись активности пользователей пачками"""
+    
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self.flushed = 0
+        self._pending: Dict[int, datetime] = {}
+        self._task = None
+    
+    def touch(self, user_id: int):
+        """Отметка активности, без обращения к БД"""
+        self._pending[user_id] = datetime.utcnow()
+    
+    async def start(self):
+        """Запуск периодической записи в фоне"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка с записью накопленного"""
+        if self._task:
+            task, self._task = self._task, None
+            task.cancel()
+            # Дожидаемся отмены: прерванная запись вернет отметки в буфер до финальной
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+    
+    async def flush(self):
+        """Запись накопленных отметок одним UPDATE"""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        
+        try:
+            async with async_session() as session:
+                await session.execute(_FLUSH_SQL, {
+                    'user_ids': list(pending),
+                    'last_seen': list(pending.values()),
+                })
+                await session.commit()
+        except asyncio.CancelledError:
+            self._restore(pending)
+            raise
+        except Exception as e:
+            logger.error(f"Error flushing user activity: {e}")
+            self._restore(pending)
+            return
+        
+        self.flushed += len(pending)
+        for user_id, last_seen in pending.items():
+            user_cache.touch(user_id, last_seen)
+    
+    def _restore(self, pending: Dict[int, datetime]):
+        """Возврат отметок в буфер без затирания более свежих"""
+        for user_id, last_seen in pending.items():
+            self._pending.setdefault(user_id, last_seen)
+
+activity_tracker = ActivityTracker(settings.ACTIVITY_FLUSH_INTERVAL)
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.core import json_codec
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+class MemoryCacheBackend:
+    """LRU кэш в памяти процесса с ограничением по числу записей и объему"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value, size = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int):
+        # Размер оцениваем по JSON представлению ответа
+        size = len(json_codec.dumps_bytes(value))
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._data[key] = (time.monotonic() + ttl, value, size)
+        self.size_bytes += size
+        while len(self._data) > self.max_entries or self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+
+    async def delete(self, key: str):
+        self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[2]
+
+    def __len__(self):
+        return len(self._data)
+
+class RedisCacheBackend:
+    """Кэш в Redis, общий для всех процессов бота"""
+
+    def __init__(self, prefix: str = "vk_cache"):
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await get_redis().get(f"{self.prefix}:{key}")
+        return json_codec.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int):
+        await get_redis().set(f"{self.prefix}:{key}", json_codec.dumps_bytes(value), ex=ttl)
+
+    async def delete(self, key: str):
+        await get_redis().delete(f"{self.prefix}:{key}")
+
+class ResponseCache:
+    """Кэш ответов с TTL по методам и объединением одинаковых запросов в полете"""
+
+    def __init__(self, backend, ttls: Dict[str, int]):
+        self.backend = backend
+        self.ttls = ttls
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.coalesced = defaultdict(int)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def is_cacheable(self, method: str) -> bool:
+        return self.ttls.get(method, 0) > 0
+
+    @staticmethod
+    def make_key(method: str, access_token: str, params: Dict) -> str:
+        """Ключ кэша: метод, хэш токена и параметры"""
+        raw = f"{access_token}:{json.dumps(params, sort_keys=True, ensure_ascii=False)}"
+        return f"{method}:{hashlib.sha256(raw.encode()).hexdigest()[:32]}"
+
+    async def _backend_get(self, key: str) -> Optional[Any]:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Cache backend get error: {e}")
+            return None
+
+    async def _backend_set(self, key: str, value: Any, ttl: int):
+        try:
+            await self.backend.set(key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Cache backend set error: {e}")
+
+    async def get_or_fetch(
+        self,
+        method: str,
+        access_token: str,
+        params: Dict,
+        fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Чтение из кэша, при промахе - один запрос на все одинаковые вызовы"""
+        key = self.make_key(method, access_token, params)
+        
+        value = await self._backend_get(key)
+        if value is not None:
+            self.hits[method] += 1
+            return value
+        
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced[method] += 1
+            return await asyncio.shield(future)
+        
+        self.misses[method] += 1
+        # Запрос - общая задача: отмена одного из ожидающих не отменяет его для остальных
+        future = asyncio.ensure_future(self._fetch(method, key, fetch))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _fetch(self, method: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        # Ошибки (None) не кэшируем, чтобы следующий запрос повторил попытку
+        if value is not None:
+            await self._backend_set(key, value, self.ttls[method])
+        return value
+
+    async def invalidate(self, method: str, access_token: str, params: Optional[Dict] = None):
+        """Удаление записи из кэша"""
+        await self.backend.delete(self.make_key(method, access_token, params or {}))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Счетчики попаданий и промахов по методам"""
+        methods = set(self.hits) | set(self.misses) | set(self.coalesced)
+        return {
+            method: {
+                'hits': self.hits[method],
+                'misses': self.misses[method],
+                'coalesced': self.coalesced[method],
+            }
+            for method in sorted(methods)
+        }
+
+def parse_ttls(raw: str) -> Dict[str, int]:
+    """Разбор строки вида 'users.get=300,ads.getAccounts=600'"""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in raw.split(','))):
+        method, _, ttl = item.partition('=')
+        ttls[method.strip()] = int(ttl)
+    return ttls
+
+def create_cache(default_ttls: Dict[str, int]) -> ResponseCache:
+    """Создание кэша ответов VK по настройкам"""
+    ttls = {**default_ttls, **parse_ttls(settings.VK_CACHE_TTLS)}
+    if settings.CACHE_BACKEND == "redis":
+        backend = RedisCacheBackend()
+    else:
+        backend = MemoryCacheBackend(settings.CACHE_MAX_ENTRIES, settings.CACHE_MAX_BYTES)
+    return ResponseCache(backend, ttls)
@@ -0,0 +1,68 @@
+"""
+Отрисовка графиков отчета в PNG. Выполняется в процессе пула (ChartService),
+поэтому модуль не зависит от настроек приложения, а matplotlib загружается только в процессах пула.
+"""
+import io
+import signal
+from datetime import date
+from typing import Dict, List
+
+# Меняется вместе с оформлением: картинки старого вида в кэше перестают совпадать по ключу
+CHART_VERSION = 1
+
+FIGURE_SIZE = (8, 7)
+DPI = 100
+
+# Панели графика: столбец ряда, подпись, цвет
+PANELS = (
+    ('spent', 'Расход, ₽', '#4a76a8'),
+    ('ctr', 'CTR, %', '#2e9c5a'),
+    ('cpc', 'CPC, ₽', '#d9822b'),
+)
+
+class RenderTimeout(Exception):
+    """Отрисовка не уложилась в отведенное время"""
+
+def _on_alarm(signum, frame):
+    raise RenderTimeout()
+
+def init_worker():
+    """Инициализация процесса пула: загрузка matplotlib и шрифтов до первого запроса"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.figure  # noqa: F401
+    import matplotlib.font_manager  # noqa: F401
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+def _render_trend(series: Dict[str, List], title: str) -> bytes:
+    from matplotlib.dates import DateFormatter
+    from matplotlib.figure import Figure
+
+    days = [date.fromisoformat(day) for day in series['day']]
+    # Figure без pyplot: не попадает в глобальный реестр фигур и освобождается сборщиком
+    figure = Figure(figsize=FIGURE_SIZE, dpi=DPI, layout='constrained')
+    figure.suptitle(title)
+    axes = figure.subplots(len(PANELS), 1, sharex=True)
+    for ax, (column, label, color) in zip(axes, PANELS):
+        values = series[column]
+        if column == 'spent':
+            ax.bar(days, values, color=color, width=0.8)
+        else:
+            ax.plot(days, values, color=color, marker='o', linewidth=2)
+        ax.set_ylabel(label)
+        ax.set_ylim(bottom=0)
+        ax.grid(axis='y', alpha=0.3)
+    axes[-1].xaxis.set_major_formatter(DateFormatter('%d.%m'))
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+def render_trend(series: Dict[str, List], title: str, timeout: float) -> bytes:
+    """PNG с динамикой расхода, CTR и CPC по дням; дольше timeout секунд - RenderTimeout"""
+    # Таймер прерывает зависшую отрисовку внутри процесса, и процесс пула освобождается
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return _render_trend(series, title)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+from app.core import json_codec
+from app.core.config import settings
+from app.services.chart_renderer import CHART_VERSION, PANELS, RenderTimeout, init_worker, render_trend
+from app.services.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Во сколько раз ожидание графика вместе с очередью может превышать время отрисовки
+QUEUE_TIMEOUT_FACTOR = 3
+
+class ChartService:
+    """
+    Графики отчета: отрисовка в пуле процессов, чтобы не занимать event loop,
+    и кэш готовых PNG по хэшу входных рядов - один и тот же график не рисуется дважды.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        workers: int = 2,
+        timeout: float = 10.0,
+        enabled: bool = True,
+        max_chats: int = 50000
+    ):
+        self.cache = DiskCache(directory, max_bytes)
+        self.workers = workers
+        self.timeout = timeout
+        self.enabled = enabled
+        self.max_chats = max_chats
+        self.rendered = 0
+        self.timeouts = 0
+        self.failed = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        # chat_id -> последний отправленный в чат график
+        self._sent: OrderedDict = OrderedDict()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # fork процесса с работающим event loop и открытыми соединениями небезопасен
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=init_worker
+            )
+        return self._executor
+
+    @staticmethod
+    def series(trend: Dict) -> Dict[str, List]:
+        """
+        Ряды для отрисовки из итогов по дням (report_engine.daily_trend): даты строками,
+        значения с точностью отчета, чтобы ключ кэша не зависел от погрешности float
+        """
+        series = {'day': [str(day) for day in trend['day']]}
+        for column, _, _ in PANELS:
+            series[column] = [round(float(value), 2) for value in trend[column]]
+        return series
+
+    @staticmethod
+    def chart_key(series: Dict[str, List], title: str) -> str:
+        """Ключ по содержимому: версия оформления, заголовок и ряды"""
+        payload = json_codec.dumps_bytes({'version': CHART_VERSION, 'title': title, 'series': series})
+        return f"{hashlib.blake2b(payload, digest_size=16).hexdigest()}.png"
+
+    async def render_trend(self, trend: Dict, title: str) -> Optional[str]:
+        """Путь к PNG с динамикой расхода, CTR и CPC; None, если графики отключены или отрисовка не удалась"""
+        if not self.enabled:
+            return None
+
+        series = self.series(trend)
+        key = self.chart_key(series, title)
+        path = self.cache.get(key)
+        if path is not None:
+            return path
+
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(key, series, title))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _render(self, key: str, series: Dict[str, List], title: str) -> Optional[str]:
+        started = time.perf_counter()
+        try:
+            # submit из потока: первый вызов запускает fork-сервер и процессы пула
+            future = await asyncio.to_thread(self._get_executor().submit, render_trend, series, title, self.timeout)
+            # Время самой отрисовки ограничивает процесс пула (render_trend).
+            # Здесь - общий предел с запасом на очередь и запуск пула при первом графике
+            png = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout * QUEUE_TIMEOUT_FACTOR)
+            path = await asyncio.to_thread(self._store, key, png)
+        except (RenderTimeout, asyncio.TimeoutError):
+            self.timeouts += 1
+            logger.warning(f"Chart {key} not rendered in time (render limit {self.timeout}s)")
+            return None
+        except BrokenProcessPool as e:
+            # Процесс пула умер (например, по памяти) - следующий запрос создаст пул заново
+            self.failed += 1
+            logger.error(f"Chart process pool is broken: {e}")
+            self.close()
+            return None
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error rendering chart {key}: {type(e).__name__} {e}")
+            return None
+
+        self.rendered += 1
+        logger.debug(f"Chart {key}: {len(png)} bytes in {time.perf_counter() - started:.2f}s")
+        return path
+
+    def _store(self, key: str, png: bytes) -> str:
+        temp_path = self.cache.temp_path(".png")
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(png)
+            return self.cache.put(key, temp_path)
+        except BaseException:
+            self.cache.discard(temp_path)
+            raise
+
+    def already_sent(self, chat_id: int, path: str) -> bool:
+        """Этот же график - последний отправленный в чат (повторное обновление отчета без новых данных)"""
+        return self._sent.get(chat_id) == path
+
+    def mark_sent(self, chat_id: int, path: str):
+        self._sent[chat_id] = path
+        self._sent.move_to_end(chat_id)
+        if len(self._sent) > self.max_chats:
+            self._sent.popitem(last=False)
+
+    def unmark_sent(self, chat_id: int, path: str):
+        """Отмена отметки, если отправка не удалась"""
+        if self._sent.get(chat_id) == path:
+            del self._sent[chat_id]
+
+    def close(self):
+        """Остановка пула процессов"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        """Нарисовано, по таймауту, с ошибкой, в работе и счетчики дискового кэша"""
+        return {
+            'rendered': self.rendered,
+            'timeouts': self.timeouts,
+            'failed': self.failed,
+            'pending': len(self._pending),
+            **self.cache.stats()
+        }
+
+chart_service = ChartService(
+    settings.CHART_DIR,
+    settings.CHART_CACHE_MAX_MB * 1024 * 1024,
+    workers=settings.CHART_WORKERS,
+    timeout=settings.CHART_RENDER_TIMEOUT,
+    enabled=settings.CHART_ENABLED
+)
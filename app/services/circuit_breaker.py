@@ -0,0 +1,68 @@
+import logging
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """
+    Размыкатель: после threshold ошибок подряд вызовы сразу отклоняются на cooldown сек,
+    затем пропускается один пробный вызов. Успех замыкает цепь, ошибка - снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, threshold: int, cooldown: float):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        """Можно ли выполнять вызов сейчас"""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # Пробный вызов, не вернувший результата (например, отмененный), не блокирует цепь навсегда
+        if self.state == self.HALF_OPEN and (not self._probe_in_flight or now - self._probe_started >= self.cooldown):
+            self._probe_in_flight = True
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+                logger.warning(f"Circuit {self.name} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'open': int(self.state != self.CLOSED),
+            'opened': self.opened,
+            'rejected': self.rejected,
+            'consecutive_failures': self.failures,
+        }
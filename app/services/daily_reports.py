@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from datetime import date, datetime
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from sqlalchemy import select, update
+from app.core.config import settings
+from app.core.database import async_session
+from app.models.user import User
+from app.models.report_run import ReportRun
+from app.bot.outbox import outbox
+from app.services.report_service import report_service
+from app.services.user_service import user_cache, user_service
+
+logger = logging.getLogger(__name__)
+
+# Как часто записывать прогресс рассылки, сек.: после сбоя повторно уйдут отчеты не больше чем за это время
+CHECKPOINT_INTERVAL = 1.0
+
+class DailyReportService:
+    """Рассылка ежедневного отчета всем активным пользователям"""
+    
+    def __init__(self, workers: int = 20, batch_size: int = 500):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.bot: Optional[Bot] = None
+        self._lock = asyncio.Lock()
+    
+    async def run(self, run_date: Optional[date] = None):
+        """Запуск или продолжение рассылки за день"""
+        if self.bot is None:
+            logger.error("Daily reports: bot is not configured")
+            return
+        if self._lock.locked():
+            logger.info("Daily reports: run already in progress")
+            return
+        
+        async with self._lock:
+            await self._run(run_date or self.today())
+    
+    @staticmethod
+    def today() -> date:
+        """День рассылки по UTC, как и расписание запуска"""
+        return datetime.utcnow().date()
+    
+    async def resume(self):
+        """Продолжение рассылки, прерванной перезапуском"""
+        async with async_session() as session:
+            run = await session.get(ReportRun, self.today())
+        if run is not None and run.status != "done":
+            logger.info(f"Daily reports: resuming run from user {run.last_user_id}")
+            await self.run(run.run_date)
+    
+    async def _load_run(self, run_date: date) -> ReportRun:
+        async with async_session() as session:
+            run = await session.get(ReportRun, run_date)
+            if run is None:
+                run = ReportRun(run_date=run_date, status="running", last_user_id=0, sent=0, failed=0, skipped=0)
+                session.add(run)
+                await session.commit()
+            return run
+    
+    async def _next_batch(self, after_user_id: int) -> List[Tuple[int]]:
+        """Следующая пачка пользователей по ключу (без OFFSET)"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(User.user_id)
+                .where(
+                    User.is_active.is_(True),
+                    User.vk_access_token.isnot(None),
+                    User.token_valid.isnot(False),
+                    User.user_id > after_user_id
+                )
+                .order_by(User.user_id)
+                .limit(self.batch_size)
+            )
+            return result.all()
+    
+    async def _run(self, run_date: date):
+        run = await self._load_run(run_date)
+        if run.status == "done":
+            return
+        
+        started = time.perf_counter()
+        # Итоги запуска и еще не записанная в базу часть
+        counters = {'sent': 0, 'failed': 0, 'skipped': 0}
+        unsaved = dict(counters)
+        cursor = run.last_user_id or 0
+        # Воркеры завершают пользователей не по порядку. В базу пишется только непрерывно
+        # обработанный префикс, чтобы продолжение не пропустило и не повторило отчеты
+        issued = deque()
+        outcomes: Dict[int, str] = {}
+        
+        def record(user_id: int, outcome: str):
+            nonlocal cursor
+            counters[outcome] += 1
+            outcomes[user_id] = outcome
+            while issued and issued[0] in outcomes:
+                cursor = issued.popleft()
+                unsaved[outcomes.pop(cursor)] += 1
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        
+        async def worker():
+            while True:
+                user_id = await queue.get()
+                try:
+                    record(user_id, await self.send_report(user_id))
+                except Exception as e:
+                    record(user_id, 'failed')
+                    logger.error(f"Daily report error for user {user_id}: {e}")
+                finally:
+                    queue.task_done()
+        
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            after_user_id = cursor
+            saved_at = time.monotonic()
+            while True:
+                batch = await self._next_batch(after_user_id)
+                if not batch:
+                    break
+                after_user_id = batch[-1][0]
+                for (user_id,) in batch:
+                    issued.append(user_id)
+                    await queue.put(user_id)
+                    if time.monotonic() - saved_at >= CHECKPOINT_INTERVAL:
+                        await self._save_progress(run_date, cursor, unsaved)
+                        saved_at = time.monotonic()
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        await self._save_progress(run_date, cursor, unsaved, done=True)
+        elapsed = time.perf_counter() - started
+        processed = sum(counters.values())
+        logger.info(
+            f"Daily reports {run_date}: {processed} users in {elapsed:.1f}s "
+            f"({processed / elapsed * 60 if elapsed else 0:.0f} users/min), "
+            f"sent={counters['sent']} skipped={counters['skipped']} failed={counters['failed']}"
+        )
+    
+    async def _save_progress(self, run_date: date, cursor: int, unsaved: dict, done: bool = False):
+        # Забираем накопленное до записи: воркеры продолжают считать, пока идет запрос
+        delta = dict(unsaved)
+        for key in unsaved:
+            unsaved[key] = 0
+        values = {
+            'last_user_id': cursor,
+            'sent': ReportRun.sent + delta['sent'],
+            'failed': ReportRun.failed + delta['failed'],
+            'skipped': ReportRun.skipped + delta['skipped'],
+        }
+        if done:
+            values.update(status="done", finished_at=datetime.utcnow())
+        async with async_session() as session:
+            await session.execute(update(ReportRun).where(ReportRun.run_date == run_date).values(**values))
+            await session.commit()
+    
+    async def send_report(self, user_id: int) -> str:
+        """Отправка отчета одному пользователю, возвращает sent | skipped | failed"""
+        async with async_session() as session:
+            accounts = await report_service.get_accounts(session, user_id)
+            if not accounts:
+                return 'skipped'
+            text = await report_service.build_report_text(
+                session, accounts, recommendations=settings.DAILY_REPORT_RECOMMENDATIONS
+            )
+        
+        try:
+            await outbox.send_message(self.bot, user_id, "🌅 <b>Ежедневный отчет</b>\n\n" + text)
+            return 'sent'
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота - больше не пишем ему
+            await self._deactivate(user_id)
+            return 'skipped'
+        except (TelegramBadRequest, TelegramRetryAfter) as e:
+            logger.error(f"Daily report rejected for user {user_id}: {e}")
+            return 'failed'
+    
+    async def _deactivate(self, user_id: int):
+        async with async_session() as session:
+            await session.execute(update(User).where(User.user_id == user_id).values(is_active=False))
+            await user_service.notify_changed(session, user_id)
+            await session.commit()
+        user_cache.invalidate(user_id)
+
+daily_report_service = DailyReportService(settings.DAILY_REPORT_WORKERS, settings.DAILY_REPORT_BATCH_SIZE)
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+# Недописанные файлы упавших процессов удаляются через этот срок, сек
+STALE_TEMP_SECONDS = 3600
+
+class DiskCache:
+    """
+    Готовые файлы в каталоге на диске. При превышении max_bytes удаляются
+    давно не использованные (время использования - mtime файла).
+    Каталог можно делить между процессами: файлы появляются атомарно через os.replace.
+    """
+
+    TEMP_PREFIX = ".tmp-"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Путь к файлу в кэше или None"""
+        path = os.path.join(self.directory, key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def temp_path(self, suffix: str = "") -> str:
+        """Временный файл в том же каталоге (чтобы перенос в кэш был атомарным)"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.directory, prefix=self.TEMP_PREFIX, suffix=suffix)
+        os.close(fd)
+        return path
+
+    def put(self, key: str, temp_path: str) -> str:
+        """Перенос готового файла в кэш и вытеснение лишнего"""
+        path = os.path.join(self.directory, key)
+        os.replace(temp_path, path)
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: str):
+        now = time.time()
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.startswith(self.TEMP_PREFIX):
+                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    self.discard(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self.discard(path)
+            self.evicted += 1
+            total -= size
+
+    @staticmethod
+    def discard(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted}
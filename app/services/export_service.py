@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.statistics import AdAccount, SyncState
+from app.services.disk_cache import DiskCache
+from app.services.export_writer import WRITERS, write_export
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = tuple(WRITERS)
+
+# Ограничение Bot API на размер файла, загружаемого ботом
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+class ExportService:
+    """Выгрузка статистики кампаний в CSV/XLSX в пуле процессов с кэшем готовых файлов"""
+
+    def __init__(self, directory: str, max_bytes: int, workers: int = 2, days: int = 30):
+        self.cache = DiskCache(directory, max_bytes)
+        self.workers = workers
+        self.days = days
+        self.generated = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Одинаковые выгрузки, запрошенные одновременно, строятся один раз
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # fork процесса с работающим event loop и открытыми соединениями небезопасен
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    def period(self) -> Tuple[date, date]:
+        """Полные дни: с days дней назад по вчера"""
+        date_to = date.today() - timedelta(days=1)
+        return date_to - timedelta(days=self.days - 1), date_to
+
+    @staticmethod
+    async def cache_key(
+        session: AsyncSession,
+        account_ids: List[int],
+        fmt: str,
+        date_from: date,
+        date_to: date
+    ) -> str:
+        """Ключ выгрузки; меняется после каждой синхронизации аккаунтов, поэтому устаревший файл не отдается"""
+        synced = await session.scalar(
+            select(func.max(SyncState.last_run_at)).where(SyncState.account_id.in_(account_ids))
+        )
+        raw = f"{','.join(map(str, sorted(account_ids)))}:{date_from}:{date_to}:{synced}"
+        return f"{hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()}.{fmt}"
+
+    async def export(self, session: AsyncSession, accounts: List[AdAccount], fmt: str) -> Tuple[str, str]:
+        """Путь к файлу выгрузки (из кэша или новый) и имя файла для пользователя"""
+        date_from, date_to = self.period()
+        account_ids = [account.account_id for account in accounts]
+        key = await self.cache_key(session, account_ids, fmt, date_from, date_to)
+        filename = f"vk_ads_{date_from:%Y%m%d}_{date_to:%Y%m%d}.{fmt}"
+
+        path = self.cache.get(key)
+        if path is not None:
+            return path, filename
+
+        future = self._pending.get(key)
+        if future is None:
+            names = {account.account_id: account.account_name or '' for account in accounts}
+            future = asyncio.ensure_future(self._generate(key, account_ids, names, date_from, date_to, fmt))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(future), filename
+
+    async def _generate(
+        self,
+        key: str,
+        account_ids: List[int],
+        names: Dict[int, str],
+        date_from: date,
+        date_to: date,
+        fmt: str
+    ) -> str:
+        started = time.perf_counter()
+        temp_path = await asyncio.to_thread(self.cache.temp_path, f".{fmt}")
+        dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+        try:
+            # Запрос, форматирование и запись файла - в отдельном процессе, event loop не занят.
+            # submit тоже из потока: первый вызов запускает fork-сервер и процессы пула
+            future = await asyncio.to_thread(
+                self._get_executor().submit, write_export,
+                dsn, account_ids, names, date_from, date_to, fmt, temp_path
+            )
+            rows = await asyncio.wrap_future(future)
+            path = await asyncio.to_thread(self.cache.put, key, temp_path)
+        except BaseException:
+            await asyncio.to_thread(self.cache.discard, temp_path)
+            raise
+
+        self.generated += 1
+        logger.info(
+            f"Export {fmt} for accounts {account_ids}: {rows} rows, "
+            f"{os.path.getsize(path)} bytes in {time.perf_counter() - started:.2f}s"
+        )
+        return path
+
+    def close(self):
+        """Остановка пула процессов"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        """Сгенерировано файлов, в работе и счетчики дискового кэша"""
+        return {'generated': self.generated, 'pending': len(self._pending), **self.cache.stats()}
+
+export_service = ExportService(
+    settings.EXPORT_DIR,
+    settings.EXPORT_CACHE_MAX_MB * 1024 * 1024,
+    workers=settings.EXPORT_WORKERS,
+    days=settings.EXPORT_DAYS
+)
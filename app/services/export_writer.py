@@ -0,0 +1,130 @@
+"""
+Запись выгрузки статистики в файл. Выполняется в процессе пула (ExportService),
+поэтому модуль не зависит от настроек и ORM: соединение с базой - свое, через asyncpg.
+"""
+import asyncio
+import csv
+from datetime import date
+from typing import Dict, List, Sequence
+
+# Строк, получаемых из курсора за раз
+FETCH_SIZE = 5000
+
+# Ограничение Excel - 1 048 576 строк на лист, первая занята заголовком
+XLSX_SHEET_ROWS = 1_048_575
+
+HEADER = [
+    'Аккаунт', 'ID аккаунта', 'ID кампании', 'Кампания', 'Дата',
+    'Показы', 'Клики', 'Охват', 'Конверсии', 'Расход, ₽', 'CTR, %', 'CPC, ₽', 'CPM, ₽',
+]
+
+EXPORT_QUERY = """
+SELECT s.account_id, s.campaign_id, c.name, s.day,
+       s.impressions, s.clicks, s.reach, s.conversions, s.spent::float8
+FROM campaign_stats s
+LEFT JOIN campaigns c ON c.campaign_id = s.campaign_id
+WHERE s.account_id = ANY($1::bigint[]) AND s.day BETWEEN $2 AND $3
+ORDER BY s.account_id, s.campaign_id, s.day
+"""
+
+def _ratio(numerator: float, denominator: float, scale: float = 1.0) -> float:
+    return round(numerator * scale / denominator, 2) if denominator else 0.0
+
+def export_row(record: Sequence, account_names: Dict[int, str]) -> List:
+    """Строка файла из строки запроса"""
+    account_id, campaign_id, name, day, impressions, clicks, reach, conversions, spent = record
+    return [
+        account_names.get(account_id, ''), account_id, campaign_id, name or '', day,
+        impressions, clicks, reach, conversions, round(spent, 2),
+        _ratio(clicks, impressions, 100.0), _ratio(spent, clicks), _ratio(spent, impressions, 1000.0),
+    ]
+
+class CsvExportWriter:
+    def __init__(self, path: str):
+        # BOM - чтобы Excel сразу открыл кириллицу в UTF-8
+        self.file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(HEADER)
+
+    def write(self, row: List):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+class XlsxExportWriter:
+    def __init__(self, path: str):
+        import xlsxwriter
+        # constant_memory: строки сразу сбрасываются во временный файл, а не копятся в памяти
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'dd.mm.yyyy'})
+        self.money_format = self.workbook.add_format({'num_format': '0.00'})
+        self.header_format = self.workbook.add_format({'bold': True})
+        self.sheet = None
+        self.sheets = 0
+        self.row = XLSX_SHEET_ROWS
+
+    def _next_sheet(self):
+        self.sheets += 1
+        self.sheet = self.workbook.add_worksheet(f"Статистика {self.sheets}" if self.sheets > 1 else "Статистика")
+        self.sheet.write_row(0, 0, HEADER, self.header_format)
+        self.sheet.set_column(0, 0, 30)
+        self.sheet.set_column(3, 3, 40)
+        self.sheet.set_column(4, 4, 12)
+        self.sheet.set_column(9, 12, 12, self.money_format)
+        self.sheet.freeze_panes(1, 0)
+        self.row = 0
+
+    def write(self, row: List):
+        if self.row >= XLSX_SHEET_ROWS:
+            self._next_sheet()
+        self.row += 1
+        self.sheet.write_row(self.row, 0, row)
+
+    def close(self):
+        if self.sheet is None:
+            self._next_sheet()
+        self.workbook.close()
+
+WRITERS = {
+    'csv': CsvExportWriter,
+    'xlsx': XlsxExportWriter,
+}
+
+async def _write_export(
+    dsn: str,
+    account_ids: List[int],
+    account_names: Dict[int, str],
+    date_from: date,
+    date_to: date,
+    fmt: str,
+    path: str
+) -> int:
+    import asyncpg
+    writer = WRITERS[fmt](path)
+    rows = 0
+    try:
+        connection = await asyncpg.connect(dsn)
+        try:
+            # Серверный курсор: в памяти только текущая пачка строк
+            async with connection.transaction(readonly=True):
+                cursor = connection.cursor(EXPORT_QUERY, account_ids, date_from, date_to, prefetch=FETCH_SIZE)
+                async for record in cursor:
+                    writer.write(export_row(record, account_names))
+                    rows += 1
+        finally:
+            await connection.close()
+    finally:
+        writer.close()
+    return rows
+
+def write_export(
+    dsn: str,
+    account_ids: List[int],
+    account_names: Dict[int, str],
+    date_from: date,
+    date_to: date,
+    fmt: str,
+    path: str
+) -> int:
+    """Выгрузка статистики аккаунтов за период в файл path, возвращает число строк"""
+    return asyncio.run(_write_export(dsn, account_ids, account_names, date_from, date_to, fmt, path))
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Атомарное резервирование токенов в Redis.
+# Часы берутся из Redis, чтобы все процессы считали время одинаково.
+# Возвращает время ожидания в секундах (строкой, чтобы не терять дробную часть).
+_REDIS_RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - requested
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+class TokenBucket:
+    """Token bucket с резервированием: ожидающие обслуживаются строго по очереди"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Резервирование токенов, возвращает время ожидания в секундах"""
+        self._refill()
+        self.tokens -= tokens
+        return max(0.0, -self.tokens / self.rate)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Неблокирующая попытка взять токены"""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0):
+        """Ожидание своей очереди"""
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+class RateLimiter:
+    """Набор token bucket'ов по ключам с локальным или Redis бэкендом"""
+
+    def __init__(
+        self,
+        prefix: str,
+        backend: str = "memory",
+        max_buckets: int = 10000
+    ):
+        self.prefix = prefix
+        self.backend = backend
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._script = None
+
+    def _local_bucket(self, key: str, rate: float, capacity: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def try_acquire(self, key: str, rate: float, capacity: Optional[float] = None) -> bool:
+        """Неблокирующая попытка взять токен (только локальный bucket процесса)"""
+        capacity = capacity if capacity is not None else rate
+        return self._local_bucket(key, rate, capacity).try_acquire()
+
+    async def _reserve_redis(self, key: str, rate: float, capacity: float) -> float:
+        if self._script is None:
+            self._script = get_redis().register_script(_REDIS_RESERVE_SCRIPT)
+        result = await self._script(
+            keys=[f"{self.prefix}:{key}"],
+            args=[rate, capacity, 1]
+        )
+        return float(result)
+
+    async def acquire(self, key: str, rate: float, capacity: Optional[float] = None):
+        """Ожидание токена в bucket'е с ключом key"""
+        capacity = capacity if capacity is not None else rate
+        if self.backend == "redis":
+            try:
+                delay = await self._reserve_redis(key, rate, capacity)
+            except Exception as e:
+                logger.warning(f"Redis rate limiter unavailable, using local bucket: {e}")
+                delay = self._local_bucket(key, rate, capacity).reserve()
+        else:
+            delay = self._local_bucket(key, rate, capacity).reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+class VKRateLimiter:
+    """Лимиты VK API: отдельный bucket на каждый токен и общий на приложение"""
+
+    def __init__(self, per_token_rate: float, global_rate: float, backend: str = "memory"):
+        self.per_token_rate = per_token_rate
+        self.global_rate = global_rate
+        self.limiter = RateLimiter("vk_rate", backend=backend)
+
+    @staticmethod
+    def token_key(access_token: str) -> str:
+        """Ключ bucket'а без хранения самого токена"""
+        return hashlib.sha256(access_token.encode()).hexdigest()[:32]
+
+    async def acquire(self, access_token: Optional[str] = None):
+        """Ожидание разрешения на запрос к VK"""
+        if access_token:
+            await self.limiter.acquire(f"token:{self.token_key(access_token)}", self.per_token_rate)
+        await self.limiter.acquire("global", self.global_rate)
+
+class TelegramRateLimiter:
+    """Лимиты Bot API: общий на бота и на каждый чат"""
+
+    def __init__(self, global_rate: float, per_chat_rate: float, backend: str = "memory"):
+        self.global_rate = global_rate
+        self.per_chat_rate = per_chat_rate
+        self.limiter = RateLimiter("tg_rate", backend=backend)
+
+    async def acquire(self, chat_id: int):
+        """Ожидание разрешения на отправку в чат"""
+        await self.limiter.acquire(f"chat:{chat_id}", self.per_chat_rate)
+        await self.limiter.acquire("global", self.global_rate)
+
+vk_rate_limiter = VKRateLimiter(
+    per_token_rate=settings.VK_API_REQUESTS_PER_SECOND,
+    global_rate=settings.VK_API_GLOBAL_REQUESTS_PER_SECOND,
+    backend=settings.RATE_LIMIT_BACKEND
+)
+
+telegram_rate_limiter = TelegramRateLimiter(
+    global_rate=settings.TELEGRAM_GLOBAL_RATE,
+    per_chat_rate=settings.TELEGRAM_CHAT_RATE,
+    backend=settings.RATE_LIMIT_BACKEND
+)
@@ -0,0 +1,186 @@
+"""
+Рекомендации по оптимизации кампаний.
+Все проверки - векторные проходы по матрице кампания x день за период истории,
+поэтому время растет линейно с числом кампаний и не зависит от числа рекомендаций.
+"""
+from datetime import date, timedelta
+from typing import Dict, Tuple
+import numpy as np
+from app.services.report_engine import SUM_COLUMNS, StatsFrame, safe_divide
+
+# Дней истории: базовые значения аккаунта и пик CTR
+HISTORY_DAYS = 28
+# Последние дни, которые сравниваются с историей (и ширина скользящего окна CTR)
+RECENT_DAYS = 7
+
+Z_THRESHOLD = 2.5  # z-оценка CPC/CPM, выше которой кампания считается выбросом
+MIN_OBSERVATIONS = 10  # Дней кампаний аккаунта в истории для базовой линии
+MIN_DEVIATION = 0.05  # Отклонение не меньше этой доли среднего: при ровной истории z не взлетает от копеек
+MIN_CLICKS = 20  # Кликов за последние дни для CPC и для вывода об отсутствии конверсий
+MIN_IMPRESSIONS = 2000  # Показов за последние дни (в окне) для CPM и CTR
+CTR_DECAY = 0.3  # Падение CTR скользящего окна от пика, доля
+UNDER_PACING = 0.5  # Средний дневной расход меньше этой доли лимита
+OVER_PACING = 0.95  # Расход от этой доли лимита - день уперся в лимит
+MIN_ZERO_CONVERSION_SPEND = 1000.0  # Расход без конверсий, ₽
+
+KINDS = ('cpc_outlier', 'cpm_outlier', 'ctr_decay', 'under_pacing', 'over_pacing', 'zero_conversions')
+
+# Вес при ранжировании: прямые потери выше упущенных возможностей
+KIND_WEIGHTS = np.array([1.0, 1.0, 0.5, 0.3, 0.5, 1.0])
+
+def campaign_matrix(
+    frame: StatsFrame,
+    date_from: date,
+    days: int
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """Кампании, их аккаунты и суммы по дням периода: столбец -> матрица кампании x дни"""
+    offset = (frame.day - np.datetime64(date_from, 'D')).astype(np.int64)
+    mask = (offset >= 0) & (offset < days)
+    campaigns, first, inverse = np.unique(frame.campaign_id[mask], return_index=True, return_inverse=True)
+    accounts = frame.account_id[mask][first]
+    # Номер ячейки - сразу индекс для bincount
+    cell = inverse.reshape(-1) * days + offset[mask]
+    size = len(campaigns) * days
+    matrices = {
+        column: np.bincount(cell, weights=getattr(frame, column)[mask], minlength=size).reshape(len(campaigns), days)
+        for column in SUM_COLUMNS
+    }
+    return campaigns, accounts, matrices
+
+def align_limits(campaigns: np.ndarray, campaign_ids: np.ndarray, day_limits: np.ndarray) -> np.ndarray:
+    """Дневные лимиты в порядке campaigns (nan - лимит неизвестен)"""
+    limits = np.full(len(campaigns), np.nan)
+    campaign_ids = np.asarray(campaign_ids, dtype=np.int64)
+    if len(campaign_ids) and len(campaigns):
+        order = np.argsort(campaign_ids)
+        sorted_ids = campaign_ids[order]
+        position = np.minimum(np.searchsorted(sorted_ids, campaigns), len(sorted_ids) - 1)
+        matched = sorted_ids[position] == campaigns
+        limits[matched] = np.asarray(day_limits, dtype=np.float64)[order][position[matched]]
+    return limits
+
+def cost_outliers(
+    cost: np.ndarray,
+    volume: np.ndarray,
+    account_index: np.ndarray,
+    accounts: int,
+    split: int,
+    scale: float,
+    min_volume: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Выбросы цены (CPC при volume = клики, CPM при volume = показы и scale = 1000).
+    Базовая линия - среднее и отклонение дневных значений кампаний того же аккаунта до последних дней.
+    Возвращает маску выбросов, текущее значение, базовое значение и переплату, ₽.
+    """
+    history_cost, history_volume = cost[:, :split], volume[:, :split]
+    days = history_cost.shape[1]
+    # В базу идут только дни с достаточным объемом, иначе цена одного клика - шум
+    observed = (history_volume >= min_volume / (cost.shape[1] - split)).astype(np.float64)
+    values = safe_divide(history_cost, history_volume, scale)
+    row_account = np.repeat(account_index, days)
+    count = np.bincount(row_account, weights=observed.ravel(), minlength=accounts)
+    total = np.bincount(row_account, weights=(values * observed).ravel(), minlength=accounts)
+    squares = np.bincount(row_account, weights=(values * values * observed).ravel(), minlength=accounts)
+    mean = safe_divide(total, count)
+    std = np.maximum(np.sqrt(np.maximum(safe_divide(squares, count) - mean * mean, 0.0)), mean * MIN_DEVIATION)
+
+    recent_volume = volume[:, split:].sum(axis=1)
+    value = safe_divide(cost[:, split:].sum(axis=1), recent_volume, scale)
+    baseline, deviation = mean[account_index], std[account_index]
+    z = safe_divide(value - baseline, deviation)
+    mask = (
+        (recent_volume >= min_volume)
+        & (count[account_index] >= MIN_OBSERVATIONS)
+        & (z > Z_THRESHOLD)
+    )
+    return mask, value, baseline, (value - baseline) * recent_volume / scale
+
+def find_recommendations(
+    frame: StatsFrame,
+    campaign_ids: np.ndarray,
+    day_limits: np.ndarray,
+    date_to: date,
+    history_days: int = HISTORY_DAYS,
+    recent_days: int = RECENT_DAYS
+) -> Dict[str, np.ndarray]:
+    """
+    Рекомендации по кампаниям кадра за history_days дней по date_to включительно,
+    отсортированные по убыванию score (взвешенный impact).
+    Столбцы: account, campaign, kind (индекс в KINDS), value, baseline, impact (сумма, ₽, которой касается рекомендация).
+    """
+    date_from = date_to - timedelta(days=history_days - 1)
+    campaigns, accounts, matrix = campaign_matrix(frame, date_from, history_days)
+    account_codes, account_index = np.unique(accounts, return_inverse=True)
+    account_index = account_index.reshape(-1)
+    split = history_days - recent_days
+
+    impressions, clicks = matrix['impressions'], matrix['clicks']
+    conversions, spent = matrix['conversions'], matrix['spent']
+    recent_spent = spent[:, split:]
+    spent_total = recent_spent.sum(axis=1)
+    clicks_total = clicks[:, split:].sum(axis=1)
+
+    # По проверке на каждый вид из KINDS: (маска, значение, база, сумма)
+    checks = []
+
+    cpc = cost_outliers(spent, clicks, account_index, len(account_codes), split, 1.0, MIN_CLICKS)
+    cpm = cost_outliers(spent, impressions, account_index, len(account_codes), split, 1000.0, MIN_IMPRESSIONS)
+    checks.append(cpc)
+    # Дорогой клик обычно означает и дорогие показы - вторая рекомендация о том же не нужна
+    checks.append((cpm[0] & ~cpc[0], *cpm[1:]))
+
+    # CTR по скользящим окнам из накопленных сумм: пик за историю против последнего окна
+    window = recent_days
+    zero = np.zeros((len(campaigns), 1))
+    cumulative_impressions = np.concatenate((zero, np.cumsum(impressions, axis=1)), axis=1)
+    cumulative_clicks = np.concatenate((zero, np.cumsum(clicks, axis=1)), axis=1)
+    rolling_impressions = cumulative_impressions[:, window:] - cumulative_impressions[:, :-window]
+    rolling_ctr = safe_divide(cumulative_clicks[:, window:] - cumulative_clicks[:, :-window], rolling_impressions, 100.0)
+    enough = rolling_impressions >= MIN_IMPRESSIONS
+    peak = np.where(enough, rolling_ctr, 0.0).max(axis=1)
+    last = rolling_ctr[:, -1]
+    decay = enough[:, -1] & (peak > 0) & (last < peak * (1.0 - CTR_DECAY))
+    checks.append((decay, last, peak, spent_total * (1.0 - safe_divide(last, peak))))
+
+    # Расход относительно дневного лимита за последние дни
+    limits = align_limits(campaigns, campaign_ids, day_limits)
+    has_limit = np.nan_to_num(limits) > 0
+    daily_spent = spent_total / recent_days
+    pacing = safe_divide(daily_spent, np.nan_to_num(limits))
+    # Только кампании, которые работали все дни: остановленная на полпути не "недорасходует"
+    running = (recent_spent > 0).all(axis=1)
+    under = has_limit & running & (pacing < UNDER_PACING)
+    checks.append((under, pacing * 100.0, np.full(len(campaigns), 100.0), (np.nan_to_num(limits) - daily_spent) * recent_days))
+    capped_days = (recent_spent >= OVER_PACING * np.nan_to_num(limits)[:, None]).sum(axis=1)
+    over = has_limit & (capped_days * 2 >= recent_days)
+    checks.append((over, capped_days.astype(np.float64), np.full(len(campaigns), float(recent_days)), np.nan_to_num(limits) * capped_days))
+
+    # Расход без конверсий - только в аккаунтах, где конверсии вообще отслеживаются
+    account_conversions = np.bincount(account_index, weights=conversions.sum(axis=1), minlength=len(account_codes))
+    no_conversions = (
+        (account_conversions[account_index] > 0)
+        & (conversions[:, split:].sum(axis=1) == 0)
+        & (clicks_total >= MIN_CLICKS)
+        & (spent_total >= MIN_ZERO_CONVERSION_SPEND)
+    )
+    checks.append((no_conversions, spent_total, np.zeros(len(campaigns)), spent_total))
+
+    rows = [np.flatnonzero(mask) for mask, _, _, _ in checks]
+    kind = np.concatenate([np.full(len(index), i, dtype=np.intp) for i, index in enumerate(rows)])
+    index = np.concatenate(rows)
+    value = np.concatenate([check[1][i] for check, i in zip(checks, rows)])
+    baseline = np.concatenate([check[2][i] for check, i in zip(checks, rows)])
+    impact = np.concatenate([check[3][i] for check, i in zip(checks, rows)])
+    score = impact * KIND_WEIGHTS[kind]
+
+    order = np.argsort(-score, kind='stable')
+    return {
+        'account': accounts[index][order],
+        'campaign': campaigns[index][order],
+        'kind': kind[order],
+        'value': value[order],
+        'baseline': baseline[order],
+        'impact': impact[order],
+        'score': score[order],
+    }
@@ -0,0 +1,235 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from sqlalchemy import select, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.statistics import CampaignStat
+
+# Столбцы, которые суммируются при группировке
+SUM_COLUMNS = ('impressions', 'clicks', 'conversions', 'spent')
+
+# Поддерживаемые ключи группировки
+GROUP_KEYS = ('account', 'campaign', 'day', 'week')
+
+def safe_divide(numerator: np.ndarray, denominator: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """Деление с нулем вместо inf/nan при нулевом знаменателе"""
+    result = np.zeros(np.broadcast(numerator, denominator).shape, dtype=np.float64)
+    np.divide(numerator * scale, denominator, out=result, where=denominator != 0)
+    return result
+
+def week_start(days: np.ndarray) -> np.ndarray:
+    """Понедельник недели для массива дат datetime64[D]"""
+    # Недели numpy отсчитываются от четверга 1970-01-01, сдвигаем к понедельнику
+    shift = np.timedelta64(3, 'D')
+    return (days + shift).astype('datetime64[W]').astype('datetime64[D]') - shift
+
+def compute_metrics(totals: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """CTR, CPC, CPM и конверсия по суммарным столбцам"""
+    return {
+        'ctr': safe_divide(totals['clicks'], totals['impressions'], 100.0),
+        'cpc': safe_divide(totals['spent'], totals['clicks']),
+        'cpm': safe_divide(totals['spent'], totals['impressions'], 1000.0),
+        'cr': safe_divide(totals['conversions'], totals['clicks'], 100.0),
+    }
+
+class StatsFrame:
+    """Статистика кампаний в колоночном виде"""
+    
+    def __init__(
+        self,
+        account_id: np.ndarray,
+        campaign_id: np.ndarray,
+        day: np.ndarray,
+        impressions: np.ndarray,
+        clicks: np.ndarray,
+        conversions: np.ndarray,
+        spent: np.ndarray
+    ):
+        self.account_id = np.asarray(account_id, dtype=np.int64)
+        self.campaign_id = np.asarray(campaign_id, dtype=np.int64)
+        self.day = np.asarray(day, dtype='datetime64[D]')
+        self.impressions = np.asarray(impressions, dtype=np.float64)
+        self.clicks = np.asarray(clicks, dtype=np.float64)
+        self.conversions = np.asarray(conversions, dtype=np.float64)
+        self.spent = np.asarray(spent, dtype=np.float64)
+    
+    def __len__(self):
+        return len(self.day)
+    
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> "StatsFrame":
+        """Построение из строк (account_id, campaign_id, day, impressions, clicks, conversions, spent)"""
+        columns = list(zip(*rows))
+        if not columns:
+            columns = [()] * 7
+        return cls(*columns)
+    
+    @classmethod
+    async def load(
+        cls,
+        session: AsyncSession,
+        account_ids: List[int],
+        date_from: date,
+        date_to: Optional[date] = None
+    ) -> "StatsFrame":
+        """Загрузка статистики аккаунтов за период из campaign_stats"""
+        query = (
+            select(
+                CampaignStat.account_id,
+                CampaignStat.campaign_id,
+                CampaignStat.day,
+                CampaignStat.impressions,
+                CampaignStat.clicks,
+                CampaignStat.conversions,
+                # Numeric приводим к float в базе, чтобы не создавать Decimal на каждую строку
+                CampaignStat.spent.cast(Float),
+            )
+            .where(CampaignStat.account_id.in_(account_ids), CampaignStat.day >= date_from)
+        )
+        if date_to is not None:
+            query = query.where(CampaignStat.day <= date_to)
+        result = await session.execute(query)
+        return cls.from_rows(result.all())
+    
+    def filter(self, mask: np.ndarray) -> "StatsFrame":
+        """Срез по булевой маске"""
+        return StatsFrame(
+            self.account_id[mask], self.campaign_id[mask], self.day[mask],
+            self.impressions[mask], self.clicks[mask], self.conversions[mask], self.spent[mask]
+        )
+    
+    def between(self, date_from: date, date_to: date) -> "StatsFrame":
+        """Срез по датам включительно"""
+        start, end = np.datetime64(date_from, 'D'), np.datetime64(date_to, 'D')
+        return self.filter((self.day >= start) & (self.day <= end))
+    
+    def key(self, name: str) -> np.ndarray:
+        """Столбец ключа группировки"""
+        if name == 'account':
+            return self.account_id
+        if name == 'campaign':
+            return self.campaign_id
+        if name == 'day':
+            return self.day
+        if name == 'week':
+            return week_start(self.day)
+        raise ValueError(f"Unknown group key: {name}")
+
+def aggregate(frame: StatsFrame, by: Union[str, Tuple[str, ...]] = ()) -> Dict[str, np.ndarray]:
+    """
+    Суммы и метрики по группам за один проход bincount.
+    by - ключ или кортеж ключей из GROUP_KEYS, пустой кортеж - итог по всему кадру.
+    """
+    keys = (by,) if isinstance(by, str) else tuple(by)
+    
+    if not keys:
+        inverse = np.zeros(len(frame), dtype=np.intp)
+        groups = {}
+        size = 1
+    elif len(keys) == 1:
+        unique, inverse = np.unique(frame.key(keys[0]), return_inverse=True)
+        groups = {keys[0]: unique}
+        size = len(unique)
+    else:
+        # Составной ключ: уникальные строки по столбцам-кодам
+        codes = []
+        uniques = []
+        for name in keys:
+            unique, code = np.unique(frame.key(name), return_inverse=True)
+            uniques.append(unique)
+            codes.append(code)
+        combined, inverse = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        groups = {name: unique[combined[:, i]] for i, (name, unique) in enumerate(zip(keys, uniques))}
+        size = len(combined)
+    
+    totals = {
+        column: np.bincount(inverse, weights=getattr(frame, column), minlength=size)
+        for column in SUM_COLUMNS
+    }
+    return {**groups, **totals, **compute_metrics(totals)}
+
+def day_over_day(frame: StatsFrame) -> Dict[str, np.ndarray]:
+    """Итоги по дням и изменение к предыдущему дню, %"""
+    daily = aggregate(frame, 'day')
+    for column in ('spent', 'impressions', 'clicks', 'ctr', 'cpc'):
+        values = daily[column]
+        previous = np.concatenate(([np.nan], values[:-1]))
+        delta = np.full(len(values), np.nan)
+        np.divide(values - previous, previous, out=delta, where=np.nan_to_num(previous) != 0)
+        daily[f'{column}_delta'] = delta * 100.0
+    return daily
+
+def daily_trend(frame: StatsFrame, date_from: date, date_to: date) -> Dict[str, np.ndarray]:
+    """Итоги и метрики по каждому дню периода, включая дни без статистики (нули)"""
+    period = frame.between(date_from, date_to)
+    days = np.arange(np.datetime64(date_from, 'D'), np.datetime64(date_to, 'D') + 1)
+    # Номер дня в периоде - сразу индекс группы, без np.unique
+    index = (period.day - days[0]).astype(np.intp)
+    totals = {
+        column: np.bincount(index, weights=getattr(period, column), minlength=len(days))
+        for column in SUM_COLUMNS
+    }
+    return {'day': days, **totals, **compute_metrics(totals)}
+
+def spend_pacing(
+    frame: StatsFrame,
+    campaign_ids: np.ndarray,
+    day_limits: np.ndarray,
+    days: int
+) -> Dict[str, np.ndarray]:
+    """Средний дневной расход кампаний относительно дневного лимита (1.0 - точно в лимит)"""
+    campaign_ids = np.asarray(campaign_ids, dtype=np.int64)
+    spent = np.zeros(len(campaign_ids), dtype=np.float64)
+    if len(campaign_ids) and len(frame):
+        order = np.argsort(campaign_ids)
+        sorted_ids = campaign_ids[order]
+        position = np.minimum(np.searchsorted(sorted_ids, frame.campaign_id), len(sorted_ids) - 1)
+        matched = sorted_ids[position] == frame.campaign_id
+        spent[order] = np.bincount(position[matched], weights=frame.spent[matched], minlength=len(sorted_ids))
+    
+    daily_spent = spent / max(days, 1)
+    limits = np.asarray(day_limits, dtype=np.float64)
+    return {
+        'campaign': campaign_ids,
+        'spent': spent,
+        'daily_spent': daily_spent,
+        'day_limit': limits,
+        'pacing': safe_divide(daily_spent, np.nan_to_num(limits)),
+    }
+
+class AccountSummary:
+    """Сводка по аккаунту для текстового отчета"""
+    
+    def __init__(self, account_id: int, totals: Dict[str, float], yesterday: Optional[Dict[str, float]]):
+        self.account_id = account_id
+        self.totals = totals
+        self.yesterday = yesterday
+
+def summarize_accounts(frame: StatsFrame, date_from: date, date_to: date) -> Dict[int, AccountSummary]:
+    """Итоги по аккаунтам за период и показатели последнего дня с изменением ко дню до него"""
+    period = frame.between(date_from, date_to)
+    by_account = aggregate(period, 'account')
+    by_account_day = aggregate(period, ('account', 'day'))
+    
+    last_day = np.datetime64(date_to, 'D')
+    summaries = {}
+    for i, account_id in enumerate(by_account['account'].tolist()):
+        totals = {name: float(values[i]) for name, values in by_account.items() if name != 'account'}
+        
+        rows = by_account_day['account'] == account_id
+        days = by_account_day['day'][rows]
+        yesterday = None
+        current = np.flatnonzero(days == last_day)
+        if current.size:
+            j = current[0]
+            spent = by_account_day['spent'][rows]
+            previous = np.flatnonzero(days == last_day - 1)
+            before = spent[previous[0]] if previous.size else 0.0
+            yesterday = {
+                'spent': float(spent[j]),
+                'spent_delta': float((spent[j] - before) / before * 100) if before else None,
+                'ctr': float(by_account_day['ctr'][rows][j]),
+            }
+        summaries[account_id] = AccountSummary(account_id, totals, yesterday)
+    return summaries
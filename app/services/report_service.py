@@ -0,0 +1,152 @@
+import html
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.statistics import AdAccount, Campaign
+
+# Период отчета, дней
+REPORT_DAYS = 7
+
+# Рекомендаций в отдельном списке
+RECOMMENDATIONS_LIMIT = 10
+
+# Текст рекомендации по виду (recommendations.KINDS)
+RECOMMENDATION_TEXTS = {
+    'cpc_outlier': "💸 <b>{name}</b>\n   CPC {value:.2f} ₽ при обычных для аккаунта {baseline:.2f} ₽: проверьте ставку и аудитории",
+    'cpm_outlier': "💸 <b>{name}</b>\n   CPM {value:.2f} ₽ при обычных для аккаунта {baseline:.2f} ₽: аудитория перегрета или ставка завышена",
+    'ctr_decay': "📉 <b>{name}</b>\n   CTR снизился до {value:.2f}% с {baseline:.2f}%: обновите креативы",
+    'under_pacing': "🐢 <b>{name}</b>\n   Расходуется {value:.0f}% дневного лимита: поднимите ставку или расширьте аудиторию",
+    'over_pacing': "🔥 <b>{name}</b>\n   Дневной лимит исчерпан {value:.0f} из {baseline:.0f} дней: увеличьте лимит, если кампания окупается",
+    'zero_conversions': "⚠️ <b>{name}</b>\n   {value:.2f} ₽ без конверсий за {days} дней: проверьте сайт или остановите кампанию",
+}
+
+class ReportService:
+    @staticmethod
+    async def get_accounts(session: AsyncSession, user_id: int) -> List[AdAccount]:
+        """Рекламные аккаунты пользователя из локальной базы"""
+        result = await session.execute(
+            select(AdAccount)
+            .where(AdAccount.user_id == user_id)
+            .order_by(AdAccount.account_id)
+        )
+        return list(result.scalars())
+    
+    @staticmethod
+    async def build_report_text(
+        session: AsyncSession,
+        accounts: List[AdAccount],
+        days: int = REPORT_DAYS,
+        recommendations: int = 0
+    ) -> str:
+        """Текст отчета по аккаунтам за последние полные дни"""
+        report_text, _ = await ReportService.build_report(session, accounts, days, recommendations)
+        return report_text
+    
+    @staticmethod
+    async def build_report(
+        session: AsyncSession,
+        accounts: List[AdAccount],
+        days: int = REPORT_DAYS,
+        recommendations: int = 0
+    ) -> Tuple[str, Optional[Dict]]:
+        """
+        Текст отчета и итоги по дням для графика (None, если за период не было показов).
+        recommendations - сколько рекомендаций добавить в конец отчета.
+        """
+        # numpy загружается при первом отчете, а не при старте процесса
+        from app.services.recommendations import HISTORY_DAYS
+        from app.services.report_engine import StatsFrame, daily_trend, summarize_accounts
+        
+        # Полные дни: с days дней назад по вчера
+        date_to = date.today() - timedelta(days=1)
+        date_from = date_to - timedelta(days=days - 1)
+        # Для рекомендаций нужна история: грузим ее сразу, одним запросом на оба расчета
+        load_from = min(date_from, date_to - timedelta(days=HISTORY_DAYS - 1)) if recommendations else date_from
+        frame = await StatsFrame.load(
+            session, [account.account_id for account in accounts], load_from, date_to
+        )
+        summaries = summarize_accounts(frame, date_from, date_to)
+        trend = daily_trend(frame, date_from, date_to)
+        if not trend['impressions'].any():
+            trend = None
+        
+        # Сначала аккаунты с наибольшим расходом
+        accounts = sorted(
+            accounts,
+            key=lambda account: summaries[account.account_id].totals['spent'] if account.account_id in summaries else 0,
+            reverse=True
+        )
+        report_text = f"📊 <b>Отчет по рекламным кампаниям</b>\n<i>за {days} дней</i>\n\n"
+        
+        for account in accounts[:3]:  # Показываем только первые 3 аккаунта
+            status_emoji = "✅" if account.account_status == 1 else "⏸️"
+            summary = summaries.get(account.account_id)
+            
+            report_text += f"{status_emoji} <b>{account.account_name or 'Без названия'}</b>\n"
+            report_text += f"   ID: <code>{account.account_id}</code>\n"
+            if summary and summary.totals['impressions']:
+                totals = summary.totals
+                report_text += f"   Расход: {totals['spent']:.2f} ₽ | Показы: {totals['impressions']:.0f} | Клики: {totals['clicks']:.0f}\n"
+                report_text += f"   CTR: {totals['ctr']:.2f}% | CPC: {totals['cpc']:.2f} ₽ | CPM: {totals['cpm']:.2f} ₽ | CR: {totals['cr']:.2f}%\n"
+                if summary.yesterday:
+                    delta = summary.yesterday['spent_delta']
+                    delta_text = f" ({delta:+.0f}% ко дню ранее)" if delta is not None else ""
+                    report_text += f"   Вчера: {summary.yesterday['spent']:.2f} ₽{delta_text}\n"
+                report_text += "\n"
+            else:
+                report_text += "   Нет показов за период\n\n"
+        
+        if len(accounts) > 3:
+            report_text += f"... и еще {len(accounts) - 3} аккаунтов\n\n"
+        
+        if recommendations:
+            advice = await ReportService.build_recommendations_text(session, accounts, recommendations, frame)
+            if advice:
+                report_text += f"💡 <b>Рекомендации</b>\n\n{advice}"
+        
+        return report_text, trend
+    
+    @staticmethod
+    async def build_recommendations_text(
+        session: AsyncSession,
+        accounts: List[AdAccount],
+        limit: int = RECOMMENDATIONS_LIMIT,
+        frame=None
+    ) -> str:
+        """
+        Самые значимые рекомендации по кампаниям аккаунтов (пустая строка, если их нет).
+        frame - уже загруженная статистика, покрывающая период истории.
+        """
+        from app.services.recommendations import HISTORY_DAYS, KINDS, RECENT_DAYS, find_recommendations
+        from app.services.report_engine import StatsFrame
+        
+        date_to = date.today() - timedelta(days=1)
+        account_ids = [account.account_id for account in accounts]
+        if frame is None:
+            frame = await StatsFrame.load(session, account_ids, date_to - timedelta(days=HISTORY_DAYS - 1), date_to)
+        result = await session.execute(
+            select(Campaign.campaign_id, Campaign.name, Campaign.day_limit.cast(Float))
+            .where(Campaign.account_id.in_(account_ids))
+        )
+        campaigns = result.all()
+        found = find_recommendations(
+            frame,
+            [campaign_id for campaign_id, _, _ in campaigns],
+            [day_limit for _, _, day_limit in campaigns],
+            date_to
+        )
+        
+        names = {campaign_id: name for campaign_id, name, _ in campaigns}
+        lines = []
+        for i in range(min(limit, len(found['campaign']))):
+            campaign_id = int(found['campaign'][i])
+            lines.append(RECOMMENDATION_TEXTS[KINDS[found['kind'][i]]].format(
+                name=html.escape(names.get(campaign_id) or f"Кампания {campaign_id}"),
+                value=found['value'][i],
+                baseline=found['baseline'][i],
+                days=RECENT_DAYS
+            ))
+        return "\n\n".join(lines) + "\n" if lines else ""
+
+report_service = ReportService()
@@ -0,0 +1,47 @@
+import logging
+from datetime import datetime
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from app.core.config import settings
+from app.services.stats_sync import stats_sync_service
+from app.services.daily_reports import daily_report_service
+from app.services.token_health import token_health_service
+
+logger = logging.getLogger(__name__)
+
+scheduler = AsyncIOScheduler(timezone="UTC")
+
+def setup_scheduler(bot=None):
+    """Регистрация фоновых задач"""
+    daily_report_service.bot = bot
+    
+    scheduler.add_job(
+        stats_sync_service.sync_all,
+        'interval',
+        minutes=settings.STATS_SYNC_INTERVAL_MINUTES,
+        id='stats_sync',
+        next_run_time=datetime.utcnow(),
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        token_health_service.sweep,
+        'interval',
+        minutes=settings.TOKEN_CHECK_INTERVAL_MINUTES,
+        id='token_health',
+        next_run_time=datetime.utcnow(),
+        max_instances=1,
+        coalesce=True,
+    )
+    if bot is not None:
+        scheduler.add_job(
+            daily_report_service.run,
+            'cron',
+            hour=settings.DAILY_REPORT_HOUR,
+            id='daily_reports',
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=3600,
+        )
+        # Рассылка, прерванная перезапуском, продолжается сразу
+        scheduler.add_job(daily_report_service.resume, id='daily_reports_resume')
+    return scheduler
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import AsyncIterator, Dict, List, Optional
+from sqlalchemy import select, delete, or_
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.bulk import bulk_upsert
+from app.core.security import decrypt_token
+from app.models.user import User
+from app.models.statistics import AdAccount, Campaign, CampaignStat, SyncState
+from app.services.vk_service import vk_service, VKAPIError
+
+logger = logging.getLogger(__name__)
+
+# Строк в одном INSERT (ограничение asyncpg - 32767 параметров)
+UPSERT_CHUNK_SIZE = 1000
+
+# Колонки campaign_stats в порядке загрузки через COPY
+STAT_COLUMNS = [
+    'campaign_id', 'day', 'account_id', 'impressions',
+    'clicks', 'reach', 'conversions', 'spent', 'updated_at'
+]
+
+def _to_decimal(value) -> Optional[Decimal]:
+    if value in (None, ''):
+        return None
+    return Decimal(str(value))
+
+def _to_int(value) -> int:
+    return int(value or 0)
+
+def parse_stat_rows(account_id: int, items: List[Dict]) -> List[Dict]:
+    """Ответ ads.getStatistics -> строки campaign_stats"""
+    now = datetime.utcnow()
+    rows = []
+    for item in items:
+        for stat in item.get('stats', []):
+            rows.append({
+                'campaign_id': int(item['id']),
+                'day': date.fromisoformat(stat['day']),
+                'account_id': account_id,
+                'impressions': _to_int(stat.get('impressions')),
+                'clicks': _to_int(stat.get('clicks')),
+                'reach': _to_int(stat.get('reach')),
+                'conversions': _to_int(stat.get('goals')),
+                'spent': _to_decimal(stat.get('spent')) or Decimal(0),
+                'updated_at': now,
+            })
+    return rows
+
+async def upsert_rows(session, model, rows: List[Dict], index_elements: List[str]):
+    """INSERT ... ON CONFLICT DO UPDATE только для действительно изменившихся строк"""
+    if not rows:
+        return
+    table = model.__table__
+    update_columns = [key for key in rows[0] if key not in index_elements and key != 'updated_at']
+    set_columns = update_columns + (['updated_at'] if 'updated_at' in rows[0] else [])
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = insert(model).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={key: stmt.excluded[key] for key in set_columns},
+            where=or_(*(
+                table.c[key].is_distinct_from(stmt.excluded[key])
+                for key in update_columns
+            ))
+        )
+        await session.execute(stmt)
+
+class StatsSyncService:
+    """Инкрементальная загрузка статистики кампаний из VK в Postgres"""
+    
+    def __init__(self):
+        self.backfill_days = settings.STATS_SYNC_BACKFILL_DAYS
+        self.lookback_days = settings.STATS_SYNC_LOOKBACK_DAYS
+        self.concurrency = settings.STATS_SYNC_CONCURRENCY
+        self._running_users = set()
+        self._tasks = set()
+    
+    def schedule_user(self, user_id: int, access_token: str):
+        """Запуск синхронизации пользователя в фоне"""
+        task = asyncio.create_task(self.sync_user(user_id, access_token))
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._task_done(user_id, done))
+    
+    def _task_done(self, user_id: int, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Stats sync error for user {user_id}: {task.exception()}")
+    
+    async def sync_all(self):
+        """Синхронизация всех подключенных пользователей"""
+        started = time.perf_counter()
+        async with async_session() as session:
+            result = await session.execute(
+                select(User.user_id, User.vk_access_token)
+                .where(
+                    User.is_active.is_(True),
+                    User.vk_access_token.isnot(None),
+                    # Отозванные токены не дергаем до переподключения
+                    User.token_valid.isnot(False)
+                )
+            )
+            users = result.all()
+        
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failed = 0
+        
+        async def run(user_id: int, encrypted_token: str):
+            nonlocal failed
+            async with semaphore:
+                # Ошибка одного пользователя не должна прерывать синхронизацию остальных
+                try:
+                    await self.sync_user(user_id, decrypt_token(encrypted_token))
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Stats sync error for user {user_id}: {e}")
+        
+        await asyncio.gather(*(run(user_id, token) for user_id, token in users))
+        logger.info(
+            f"Stats sync finished: {len(users)} users ({failed} failed) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+    
+    async def sync_user(self, user_id: int, access_token: str):
+        """Синхронизация аккаунтов одного пользователя"""
+        if not access_token or user_id in self._running_users:
+            return
+        self._running_users.add(user_id)
+        try:
+            accounts = await vk_service.get_ad_accounts(access_token)
+            if accounts is None:
+                return
+            
+            async with async_session() as session:
+                await upsert_rows(session, AdAccount, [
+                    {
+                        'user_id': user_id,
+                        'account_id': int(account['account_id']),
+                        'account_name': account.get('account_name'),
+                        'account_type': account.get('account_type'),
+                        'account_status': _to_int(account.get('account_status')),
+                        'access_role': account.get('access_role'),
+                        'updated_at': datetime.utcnow(),
+                    }
+                    for account in accounts
+                ], ['user_id', 'account_id'])
+                # Аккаунты, к которым пропал доступ, больше не показываем
+                await session.execute(
+                    delete(AdAccount).where(
+                        AdAccount.user_id == user_id,
+                        AdAccount.account_id.notin_([int(account['account_id']) for account in accounts])
+                    )
+                )
+                await session.commit()
+            
+            for account in accounts:
+                try:
+                    await self.sync_account(access_token, account)
+                except Exception as e:
+                    logger.error(f"Stats sync error for account {account.get('account_id')}: {e}")
+        finally:
+            self._running_users.discard(user_id)
+    
+    async def _iter_campaigns(self, access_token: str, account: Dict) -> AsyncIterator[List[Dict]]:
+        account_id = int(account['account_id'])
+        if account.get('account_type') != 'agency':
+            async for campaigns in vk_service.iter_campaigns(access_token, account_id):
+                yield campaigns
+            return
+        
+        # У агентских аккаунтов кампании запрашиваются по каждому клиенту
+        clients = await vk_service.get_ad_clients(access_token, account_id)
+        if clients is None:
+            raise VKAPIError(f"ads.getClients failed for account {account_id}")
+        client_ids = [client['id'] for client in clients]
+        async for campaigns in vk_service.iter_campaigns(access_token, account_id, client_ids):
+            yield campaigns
+    
+    async def _save_campaigns(self, account_id: int, campaigns: List[Dict]):
+        now = datetime.utcnow()
+        async with async_session() as session:
+            await upsert_rows(session, Campaign, [
+                {
+                    'campaign_id': int(campaign['id']),
+                    'account_id': account_id,
+                    'client_id': campaign.get('client_id'),
+                    'name': campaign.get('name'),
+                    'status': _to_int(campaign.get('status')),
+                    'day_limit': _to_decimal(campaign.get('day_limit')),
+                    'all_limit': _to_decimal(campaign.get('all_limit')),
+                    'updated_at': now,
+                }
+                for campaign in campaigns
+            ], ['campaign_id'])
+            await session.commit()
+    
+    async def sync_account(self, access_token: str, account: Dict):
+        """Загрузка новых и изменившихся дней статистики аккаунта"""
+        account_id = int(account['account_id'])
+        today = date.today()
+        
+        async with async_session() as session:
+            state = await session.get(SyncState, account_id)
+        
+        if state and state.synced_until:
+            # Последние дни VK еще пересчитывает, поэтому берем их повторно
+            date_from = state.synced_until - timedelta(days=self.lookback_days)
+        else:
+            date_from = today - timedelta(days=self.backfill_days)
+        
+        # Данные пишутся по мере получения страниц: в памяти только id кампаний и текущая часть,
+        # а запросы к VK выполняются без открытой сессии, чтобы не держать соединение из пула
+        campaign_ids = []
+        async for campaigns in self._iter_campaigns(access_token, account):
+            campaign_ids.extend(int(campaign['id']) for campaign in campaigns)
+            await self._save_campaigns(account_id, campaigns)
+        
+        # Пока часть статистики пишется через COPY, следующая уже загружается из VK
+        async for items in vk_service.iter_statistics(
+            access_token, account_id, campaign_ids, date_from.isoformat(), today.isoformat()
+        ):
+            stat_rows = parse_stat_rows(account_id, items)
+            if stat_rows:
+                await bulk_upsert(
+                    CampaignStat.__table__,
+                    STAT_COLUMNS,
+                    (tuple(row[column] for column in STAT_COLUMNS) for row in stat_rows),
+                    ['campaign_id', 'day']
+                )
+        
+        # Отметка синхронизации сдвигается только после загрузки всех частей
+        async with async_session() as session:
+            await upsert_rows(session, SyncState, [
+                {'account_id': account_id, 'synced_until': today, 'last_run_at': datetime.utcnow()}
+            ], ['account_id'])
+            await session.commit()
+
+stats_sync_service = StatsSyncService()
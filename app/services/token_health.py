@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import bindparam, select, update, or_
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.security import decrypt_token, encrypt_token
+from app.models.user import User
+from app.services.rate_limiter import TokenBucket
+from app.services.user_service import user_service, user_cache
+from app.services.vk_service import vk_service
+
+logger = logging.getLogger(__name__)
+
+class TokenHealthService:
+    """
+    Фоновая проверка сохраненных VK токенов. Результат пишется в users:
+    статус берется из БД без запроса к VK, а синхронизация и рассылка пропускают отозванные токены.
+    """
+
+    def __init__(self, rate: float, max_age_hours: float, batch_size: int = 200):
+        self.max_age = timedelta(hours=max_age_hours)
+        self.batch_size = batch_size
+        # Своя доля лимита: проверка не должна съедать квоту, нужную отчетам
+        self.bucket = TokenBucket(rate)
+        self._lock = asyncio.Lock()
+        self._tasks = set()
+
+    def schedule_user(self, user_id: int, access_token: str):
+        """Проверка только что подключенного токена в фоне"""
+        task = asyncio.create_task(self.check_user(user_id, access_token))
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._task_done(user_id, done))
+
+    def _task_done(self, user_id: int, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Token check error for user {user_id}: {task.exception()}")
+
+    async def check_user(self, user_id: int, access_token: str):
+        """Проверка токена одного пользователя"""
+        row = await self._check(user_id, encrypt_token(access_token))
+        if row is not None:
+            await self._save([row], [user_id])
+
+    async def sweep(self):
+        """Проверка всех токенов, не проверявшихся дольше max_age"""
+        if self._lock.locked():
+            logger.info("Token check: sweep already in progress")
+            return
+
+        async with self._lock:
+            started = time.perf_counter()
+            checked_before = datetime.utcnow() - self.max_age
+            counters = {'valid': 0, 'invalid': 0, 'unknown': 0}
+            after_user_id = 0
+            try:
+                while True:
+                    batch = await self._next_batch(after_user_id, checked_before)
+                    if not batch:
+                        break
+                    after_user_id = batch[-1].user_id
+
+                    # _check не бросает исключений: сбой одного токена - результат неизвестен
+                    rows = await asyncio.gather(*(
+                        self._check(user.user_id, user.vk_access_token)
+                        for user in batch
+                    ))
+                    previous = {user.user_id: (user.token_valid, user.vk_name) for user in batch}
+                    results = [row for row in rows if row is not None]
+                    # Кэш сбрасываем только тем, у кого что-то поменялось
+                    changed = [
+                        row['user_id'] for row in results
+                        if previous[row['user_id']] != (row['token_valid'], row['vk_name'])
+                    ]
+                    try:
+                        await self._save(results, changed)
+                    except Exception as e:
+                        # Пачка не записалась - ее токены проверим при следующем обходе, остальные пачки продолжаем
+                        logger.error(f"Token check save error (batch up to user {after_user_id}): {e}")
+                        counters['unknown'] += len(rows)
+                        continue
+
+                    for row in rows:
+                        if row is None:
+                            counters['unknown'] += 1
+                        else:
+                            counters['valid' if row['token_valid'] else 'invalid'] += 1
+            finally:
+                logger.info(f"Token check finished: {counters} in {time.perf_counter() - started:.1f}s")
+
+    async def _next_batch(self, after_user_id: int, checked_before: datetime) -> List:
+        """Следующая пачка токенов к проверке по ключу (без OFFSET)"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(User.user_id, User.vk_access_token, User.token_valid, User.vk_name)
+                .where(
+                    User.is_active.is_(True),
+                    User.vk_access_token.isnot(None),
+                    # Отозванный токен не оживет: ждем переподключения пользователя
+                    User.token_valid.isnot(False),
+                    or_(User.token_checked_at.is_(None), User.token_checked_at < checked_before),
+                    User.user_id > after_user_id
+                )
+                .order_by(User.user_id)
+                .limit(self.batch_size)
+            )
+            return result.all()
+
+    async def _check(self, user_id: int, stored_token: str) -> Optional[Dict]:
+        """Новое состояние пользователя (stored_token - токен в виде из БД) или None, если VK не ответил"""
+        try:
+            await self.bucket.acquire()
+            started_at = datetime.utcnow()
+            valid, info = await vk_service.check_token(decrypt_token(stored_token))
+        except Exception as e:
+            logger.error(f"Token check error for user {user_id}: {e}")
+            return None
+        if valid is None:
+            # VK недоступен - прежнее состояние оставляем, проверим в следующий раз
+            return None
+
+        name = f"{info.get('first_name', '')} {info.get('last_name', '')}".strip() if info else None
+        row = {
+            'user_id': user_id,
+            'token': stored_token,
+            'token_valid': valid,
+            'vk_name': name,
+            'started_at': started_at,
+            'checked_at': datetime.utcnow(),
+        }
+        if not valid:
+            logger.info(f"VK token of user {user_id} is no longer valid")
+        return row
+
+    async def _save(self, rows: List[Dict], changed: List[int]):
+        if not rows:
+            return
+        table = User.__table__
+        # Одним executemany. Если пользователь переподключил VK, пока шла проверка (в том числе
+        # пока она ждала лимит), в users уже другой токен - результат по старому не пишем.
+        # token_checked_at новее начала проверки - токен успела проверить более свежая проверка
+        stmt = (
+            update(table)
+            .where(
+                table.c.user_id == bindparam('b_user_id'),
+                table.c.vk_access_token == bindparam('b_token'),
+                or_(table.c.token_checked_at.is_(None), table.c.token_checked_at <= bindparam('b_started_at'))
+            )
+            .values(
+                token_valid=bindparam('b_token_valid'),
+                token_checked_at=bindparam('b_checked_at'),
+                vk_name=bindparam('b_vk_name')
+            )
+        )
+        async with async_session() as session:
+            await session.execute(stmt, [{f"b_{key}": value for key, value in row.items()} for row in rows])
+            for user_id in changed:
+                await user_service.notify_changed(session, user_id)
+            await session.commit()
+        for user_id in changed:
+            user_cache.invalidate(user_id)
+
+token_health_service = TokenHealthService(
+    rate=settings.TOKEN_CHECK_RATE,
+    max_age_hours=settings.TOKEN_CHECK_MAX_AGE_HOURS,
+    batch_size=settings.TOKEN_CHECK_BATCH_SIZE
+)
@@ -1,37 +1,117 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import make_transient_to_detached
 from app.models.user import User
+from app.core.config import settings
 from app.core.security import encrypt_token, decrypt_token
+from collections import OrderedDict
 from datetime import datetime
+from typing import Optional
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Канал Postgres для сброса кэша пользователей во всех процессах
+USER_CACHE_CHANNEL = "user_cache_invalidate"
+
+class UserCache:
+    """Ограниченный LRU кэш пользователей и расшифрованных токенов"""
+    
+    def __init__(self, max_size: int = 10000, ttl: int = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Счетчик сбросов: загрузка, начатая до сброса, не попадет в кэш
+        self.epoch = 0
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()
+    
+    @staticmethod
+    def _snapshot(user: User) -> User:
+        """Отвязанная от сессии копия пользователя"""
+        copy = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+        make_transient_to_detached(copy)
+        return copy
+    
+    def get(self, user_id: int) -> Optional[tuple]:
+        entry = self._data.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(user_id)
+        return entry
+    
+    def set(self, user: User, epoch: int) -> tuple:
+        token = decrypt_token(user.vk_access_token) if user.vk_access_token else None
+        entry = (time.monotonic() + self.ttl, self._snapshot(user), token)
+        if epoch == self.epoch:
+            self._data[user.user_id] = entry
+            self._data.move_to_end(user.user_id)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return entry
+    
+    def touch(self, user_id: int, last_seen: datetime):
+        """Обновление last_seen у закэшированного пользователя"""
+        entry = self._data.get(user_id)
+        if entry is not None:
+            entry[1].last_seen = last_seen
+    
+    def invalidate(self, user_id: Optional[int] = None):
+        """Сброс одного пользователя или всего кэша"""
+        self.epoch += 1
+        if user_id is None:
+            self._data.clear()
+        else:
+            self._data.pop(user_id, None)
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
 class UserService:
     @staticmethod
-    async def get_user_by_telegram_id(session: AsyncSession, user_id: int) -> User:
-        """Получение пользователя по Telegram ID"""
+    async def _get_cached(session: AsyncSession, user_id: int) -> Optional[tuple]:
+        """Запись кэша (срок, пользователь, токен), при промахе - загрузка из БД"""
+        entry = user_cache.get(user_id)
+        if entry is not None:
+            return entry
+        
+        epoch = user_cache.epoch
         result = await session.execute(
             select(User).where(User.user_id == user_id)
         )
-        return result.scalar_one_or_none()
+        user = result.scalar_one_or_none()
+        if user is None:
+            return None
+        return user_cache.set(user, epoch)
     
     @staticmethod
-    async def create_user(session: AsyncSession, user_id: int) -> User:
-        """Создание нового пользователя"""
-        user = User(user_id=user_id)
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-        return user
+    async def get_user_by_telegram_id(session: AsyncSession, user_id: int) -> User:
+        """Получение пользователя по Telegram ID"""
+        entry = await UserService._get_cached(session, user_id)
+        return entry[1] if entry else None
     
     @staticmethod
     async def get_or_create_user(session: AsyncSession, user_id: int) -> User:
-        """Получение или создание пользователя"""
-        user = await UserService.get_user_by_telegram_id(session, user_id)
-        if not user:
-            user = await UserService.create_user(session, user_id)
-        return user
+        """Получение или создание пользователя одним запросом"""
+        entry = user_cache.get(user_id)
+        if entry is not None:
+            return entry[1]
+        
+        epoch = user_cache.epoch
+        now = datetime.utcnow()
+        stmt = insert(User).values(user_id=user_id, created_at=now, last_seen=now, is_active=True)
+        # Повторный /start не падает на первичном ключе, а только обновляет last_seen
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.user_id],
+            set_={'last_seen': stmt.excluded.last_seen}
+        ).returning(User)
+        user = (await session.scalars(stmt)).one()
+        await session.commit()
+        return user_cache.set(user, epoch)[1]
     
     @staticmethod
     async def update_vk_data(
@@ -50,22 +130,85 @@ class UserService:
                 .values(
                     vk_user_id=vk_user_id,
                     vk_access_token=encrypted_token,
-                    last_seen=datetime.utcnow()
+                    last_seen=datetime.utcnow(),
+                    # Токен только что выдан VK; имя заполнит фоновая проверка
+                    vk_name=None,
+                    token_valid=True,
+                    token_checked_at=datetime.utcnow()
                 )
             )
+            await UserService.notify_changed(session, user_id)
             await session.commit()
             return True
         except Exception as e:
             logger.error(f"Error updating VK data: {e}")
             await session.rollback()
             return False
+        finally:
+            user_cache.invalidate(user_id)
+    
+    @staticmethod
+    async def notify_changed(session: AsyncSession, user_id: int):
+        """Оповещение других процессов об изменении пользователя (уходит при commit)"""
+        if settings.USER_CACHE_NOTIFY:
+            await session.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {'channel': USER_CACHE_CHANNEL, 'payload': str(user_id)}
+            )
     
     @staticmethod
     async def get_vk_token(session: AsyncSession, user_id: int) -> str:
         """Получение расшифрованного VK токена"""
-        user = await UserService.get_user_by_telegram_id(session, user_id)
-        if user and user.vk_access_token:
-            return decrypt_token(user.vk_access_token)
-        return None
+        entry = await UserService._get_cached(session, user_id)
+        return entry[2] if entry else None
+
+class UserCacheListener:
+    """Сброс кэша пользователей по LISTEN/NOTIFY из других процессов"""
+    
+    def __init__(self, channel: str = USER_CACHE_CHANNEL):
+        self.channel = channel
+        self.connection = None
+        self._task = None
+        self._lost = None
+    
+    async def start(self):
+        """Запуск слушателя в фоне"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка слушателя"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.connection and not self.connection.is_closed():
+            await self.connection.close()
+    
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            user_cache.invalidate(int(payload))
+        except ValueError:
+            user_cache.invalidate()
+    
+    async def _run(self):
+        import asyncpg
+        dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+        while True:
+            try:
+                self._lost = asyncio.Event()
+                self.connection = await asyncpg.connect(dsn)
+                self.connection.add_termination_listener(lambda connection: self._lost.set())
+                await self.connection.add_listener(self.channel, self._on_notify)
+                # Пока слушателя не было, уведомления могли потеряться
+                user_cache.invalidate()
+                await self._lost.wait()
+                logger.warning("User cache listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"User cache listener error: {e}")
+            await asyncio.sleep(5)
+
+user_cache_listener = UserCacheListener()
 
-user_service = UserService()
\ No newline at end of file
+user_service = UserService()
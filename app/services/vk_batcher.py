@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from app.core import json_codec
+from app.core.metrics import vk_request_errors
+
+logger = logging.getLogger(__name__)
+
+# Ограничение VK на количество обращений к API внутри одного execute
+EXECUTE_MAX_CALLS = 25
+
+class _PendingCall:
+    __slots__ = ('method', 'params', 'future')
+
+    def __init__(self, method: str, params: Dict, future: asyncio.Future):
+        self.method = method
+        self.params = params
+        self.future = future
+
+class VKBatcher:
+    """Склейка вызовов VK API одного токена в один запрос execute"""
+
+    def __init__(self, service, window: float = 0.01, max_calls: int = EXECUTE_MAX_CALLS):
+        self.service = service
+        self.window = window
+        self.max_calls = max_calls
+        self._pending: Dict[str, List[_PendingCall]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # Отправляемые пачки (ссылки держим, чтобы задачи не собрал сборщик мусора)
+        self._tasks = set()
+
+    async def call(self, method: str, access_token: str, params: Dict) -> Any:
+        """Постановка вызова в очередь, результат приходит после отправки пачки"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(access_token, [])
+        batch.append(_PendingCall(method, params, future))
+        
+        if len(batch) >= self.max_calls:
+            # Полная пачка уходит сразу: следующие вызовы начинают новую, а не дописываются в эту
+            self._flush(access_token)
+        elif len(batch) == 1:
+            self._timers[access_token] = loop.call_later(self.window, self._flush, access_token)
+        
+        return await future
+
+    def _flush(self, access_token: str):
+        timer = self._timers.pop(access_token, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(access_token, None)
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(access_token, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, access_token: str, batch: List[_PendingCall]):
+        try:
+            if len(batch) == 1:
+                call = batch[0]
+                results = [await self.service.call_method(call.method, access_token, **call.params)]
+            else:
+                results = await self._execute(access_token, batch)
+        except Exception as e:
+            logger.error(f"VK batch error: {e}")
+            results = [None] * len(batch)
+        
+        # Ответ короче пачки - оставшимся вызовам None, иначе их ожидание не завершится
+        results = list(results)[:len(batch)]
+        results += [None] * (len(batch) - len(results))
+        for call, result in zip(batch, results):
+            if not call.future.done():
+                call.future.set_result(result)
+
+    @staticmethod
+    def build_code(batch: List[_PendingCall]) -> str:
+        """VKScript, возвращающий массив результатов в порядке вызовов"""
+        calls = ",".join(
+            f"API.{call.method}({json_codec.dumps(call.params)})"
+            for call in batch
+        )
+        return f"return [{calls}];"
+
+    async def _execute(self, access_token: str, batch: List[_PendingCall]) -> List[Optional[Any]]:
+        data = await self.service.call_raw('execute', access_token, code=self.build_code(batch))
+        if not data or 'response' not in data:
+            logger.error(f"VK execute error: {data}")
+            return [None] * len(batch)
+        
+        for error in data.get('execute_errors', []):
+            logger.error(f"VK API error in execute ({error.get('method')}): {error}")
+            vk_request_errors.inc(error.get('method', 'execute'), str(error.get('error_code')))
+        
+        # Неуспешные вызовы внутри execute возвращают false
+        return [
+            None if result is False else result
+            for result in data['response']
+        ]
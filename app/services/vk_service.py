@@ -1,31 +1,227 @@
 import aiohttp
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+import random
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
 from app.core.config import settings
+from app.services.rate_limiter import vk_rate_limiter
+from app.services.vk_batcher import VKBatcher
+from app.services.cache import create_cache
+from app.services.circuit_breaker import CircuitBreaker
+from app.core import json_codec
+from app.core.metrics import vk_request_duration, vk_request_errors
 
 logger = logging.getLogger(__name__)
 
+# Максимум id в одном вызове ads.getStatistics
+STATISTICS_MAX_IDS = 2000
+# Максимальный limit для методов с offset (ads.getAds и др.)
+ADS_PAGE_SIZE = 2000
+
+# Токен отозван, истек или пользователь сменил пароль
+VK_ERROR_AUTH = 5
+# Коды ошибок VK, после которых запрос стоит повторить
+VK_ERROR_TOO_MANY_REQUESTS = 6
+VK_ERROR_FLOOD_CONTROL = 9
+VK_ERROR_INTERNAL = 10
+RETRY_ERROR_CODES = {VK_ERROR_TOO_MANY_REQUESTS, VK_ERROR_FLOOD_CONTROL, VK_ERROR_INTERNAL}
+
+class VKAPIError(Exception):
+    """Ошибка VK API при постраничной загрузке"""
+
+class VKHTTPError(Exception):
+    """Ответ VK с HTTP статусом, отличным от 200"""
+    
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+def vk_error_code(data: Any) -> Optional[int]:
+    """Код ошибки из ответа VK или None"""
+    if isinstance(data, dict) and 'error' in data:
+        error = data['error']
+        return error.get('error_code') if isinstance(error, dict) else error
+    return None
+
 class VKService:
+    # TTL кэша для методов чтения, сек (переопределяются через VK_CACHE_TTLS)
+    CACHE_TTLS = {
+        'users.get': 300,
+        'ads.getAccounts': settings.CACHE_TTL,
+    }
+    
     def __init__(self):
-        self.base_url = "https://api.vk.com/method"
+        self.base_url = settings.VK_API_URL
         self.api_version = "5.131"
         self.session = None
+        self.rate_limiter = vk_rate_limiter
+        self.batcher = VKBatcher(self, window=settings.VK_BATCH_WINDOW) if settings.VK_BATCHING else None
+        self.cache = create_cache(self.CACHE_TTLS)
+        self.breaker = CircuitBreaker("vk", settings.VK_BREAKER_THRESHOLD, settings.VK_BREAKER_COOLDOWN)
+        self.http_stats = {
+            'connections_created': 0,
+            'connections_reused': 0,
+            'connections_queued': 0,
+            'retries': 0,
+        }
     
-    async def get_session(self):
-        """Получение HTTP сессии"""
-        if self.session is None:
-            self.session = aiohttp.ClientSession()
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Общая HTTP сессия: ограниченный пул keep-alive соединений и таймауты"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.VK_HTTP_LIMIT,
+                limit_per_host=settings.VK_HTTP_LIMIT_PER_HOST,
+                ttl_dns_cache=settings.VK_DNS_CACHE_TTL,
+                keepalive_timeout=settings.VK_HTTP_KEEPALIVE,
+                enable_cleanup_closed=True
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=settings.VK_HTTP_TIMEOUT,
+                connect=settings.VK_HTTP_CONNECT_TIMEOUT
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                trace_configs=[self._trace_config()]
+            )
         return self.session
     
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Счетчики новых и переиспользованных соединений"""
+        trace = aiohttp.TraceConfig()
+        
+        async def on_create(session, context, params):
+            self.http_stats['connections_created'] += 1
+        
+        async def on_reuse(session, context, params):
+            self.http_stats['connections_reused'] += 1
+        
+        async def on_queued(session, context, params):
+            # Все соединения к хосту заняты - запрос ждет свободного
+            self.http_stats['connections_queued'] += 1
+        
+        trace.on_connection_create_end.append(on_create)
+        trace.on_connection_reuseconn.append(on_reuse)
+        trace.on_connection_queued_start.append(on_queued)
+        return trace
+    
     async def close(self):
         """Закрытие HTTP сессии"""
         if self.session:
             await self.session.close()
+            self.session = None
+    
+    def stats(self) -> Dict[str, int]:
+        """Соединения, повторы и состояние размыкателя"""
+        return {**self.http_stats, **self.breaker.stats()}
+    
+    async def _request(
+        self,
+        url: str,
+        params: Dict,
+        access_token: Optional[str] = None,
+        method: str = "oauth",
+        post: bool = False
+    ) -> Dict:
+        """Запрос к VK через общий лимитер скорости; HTTP ошибки - VKHTTPError"""
+        await self.rate_limiter.acquire(access_token)
+        
+        session = await self.get_session()
+        started = time.perf_counter()
+        # Параметры методов передаются формой: длинные списки id и код execute не влезают в URL
+        request = session.post(url, data=params) if post else session.get(url, params=params)
+        try:
+            async with request as response:
+                if response.status != 200:
+                    vk_request_errors.inc(method, f"http_{response.status}")
+                    raise VKHTTPError(response.status)
+                data = json_codec.loads(await response.read())
+        except VKHTTPError:
+            raise
+        except Exception as e:
+            vk_request_errors.inc(method, type(e).__name__)
+            raise
+        finally:
+            vk_request_duration.observe(time.perf_counter() - started, method)
+        
+        code = vk_error_code(data)
+        if code is not None:
+            vk_request_errors.inc(method, str(code))
+        return data
+    
+    async def call_raw(self, method: str, access_token: str, **params) -> Optional[Dict]:
+        """Вызов метода VK API, возвращает ответ целиком; временные ошибки повторяются"""
+        params.update(access_token=access_token, v=self.api_version)
+        
+        if not self.breaker.allow():
+            # VK недоступен - не ждем таймаутов, сразу отдаем ошибку
+            vk_request_errors.inc(method, "circuit_open")
+            return None
+        
+        data = None
+        for attempt in range(settings.VK_RETRIES + 1):
+            try:
+                data = await self._request(f"{self.base_url}/{method}", params, access_token, method, post=True)
+            # ValueError - тело ответа не JSON (например, страница ошибки прокси)
+            except (aiohttp.ClientError, asyncio.TimeoutError, VKHTTPError, ValueError) as e:
+                data = None
+                if isinstance(e, VKHTTPError) and e.status < 500:
+                    # 4xx повтором не исправить, и VK при этом отвечает
+                    logger.error(f"VK API request error ({method}): {e}")
+                    self.breaker.record_success()
+                    return None
+                error = f"{type(e).__name__} {e}".strip()
+            else:
+                code = vk_error_code(data)
+                if code not in RETRY_ERROR_CODES:
+                    self.breaker.record_success()
+                    return data
+                error = f"VK error {code}"
+            
+            if attempt < settings.VK_RETRIES:
+                self.http_stats['retries'] += 1
+                # Экспоненциальная задержка со случайным разбросом, чтобы повторы не шли волной
+                await asyncio.sleep(random.uniform(0, settings.VK_RETRY_BACKOFF * 2 ** attempt))
+        
+        logger.error(f"VK API request failed after {settings.VK_RETRIES + 1} attempts ({method}): {error}")
+        # Лимиты запросов (6, 9) - проблема токена, а не доступности VK
+        if data is None or vk_error_code(data) == VK_ERROR_INTERNAL:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return data
+    
+    async def call_method(self, method: str, access_token: str, **params) -> Any:
+        """Вызов метода VK API, возвращает поле response или None"""
+        data = await self.call_raw(method, access_token, **params)
+        
+        if data is None:
+            return None
+        if 'response' in data:
+            return data['response']
+        
+        logger.error(f"VK API error ({method}): {data}")
+        return None
+    
+    async def call(self, method: str, access_token: str, **params) -> Any:
+        """Вызов метода VK API через кэш и объединение соседних вызовов в execute"""
+        if self.cache.is_cacheable(method):
+            return await self.cache.get_or_fetch(
+                method, access_token, params,
+                lambda: self._call_batched(method, access_token, params)
+            )
+        return await self._call_batched(method, access_token, params)
+    
+    async def _call_batched(self, method: str, access_token: str, params: Dict) -> Any:
+        if self.batcher is None:
+            return await self.call_method(method, access_token, **params)
+        return await self.batcher.call(method, access_token, params)
     
     async def exchange_code_for_token(self, code: str) -> Optional[Dict]:
         """Обмен code на access_token"""
-        url = "https://oauth.vk.com/access_token"
+        url = f"{settings.VK_OAUTH_URL}/access_token"
         params = {
             'client_id': settings.VK_APP_ID,
             'client_secret': settings.VK_APP_SECRET,
@@ -33,69 +229,162 @@ class VKService:
             'code': code
         }
         
-        session = await self.get_session()
         try:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if 'access_token' in data:
-                        return data
-                    else:
-                        logger.error(f"VK OAuth error: {data}")
-                        return None
-                else:
-                    logger.error(f"VK OAuth HTTP error: {response.status}")
-                    return None
+            data = await self._request(url, params)
         except Exception as e:
             logger.error(f"VK OAuth request error: {e}")
             return None
-    
-    async def get_user_info(self, access_token: str) -> Optional[Dict]:
-        """Получение информации о пользователе"""
-        url = f"{self.base_url}/users.get"
-        params = {
-            'access_token': access_token,
-            'v': self.api_version
-        }
         
-        session = await self.get_session()
-        try:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if 'response' in data:
-                        return data['response'][0]
-                    else:
-                        logger.error(f"VK API error: {data}")
-                        return None
-        except Exception as e:
-            logger.error(f"VK API request error: {e}")
+        if data is None:
             return None
+        if 'access_token' in data:
+            return data
+        
+        logger.error(f"VK OAuth error: {data}")
+        return None
+    
+    async def check_token(self, access_token: str) -> Tuple[Optional[bool], Optional[Dict]]:
+        """
+        Проверка токена мимо кэша и execute: (True, пользователь) - токен рабочий,
+        (False, None) - токен недействителен, (None, None) - VK не ответил, результат неизвестен
+        """
+        data = await self.call_raw('users.get', access_token)
+        if data is None:
+            return None, None
+        if 'response' in data:
+            users = data['response']
+            return True, users[0] if users else None
+        if vk_error_code(data) == VK_ERROR_AUTH:
+            return False, None
+        logger.error(f"VK token check error: {data}")
+        return None, None
     
     async def get_ad_accounts(self, access_token: str) -> Optional[list]:
         """Получение списка рекламных аккаунтов"""
-        url = f"{self.base_url}/ads.getAccounts"
-        params = {
-            'access_token': access_token,
-            'v': self.api_version
-        }
+        return await self.call('ads.getAccounts', access_token)
+    
+    async def get_ad_clients(self, access_token: str, account_id: int) -> Optional[list]:
+        """Получение клиентов агентского аккаунта"""
+        return await self.call('ads.getClients', access_token, account_id=account_id)
+    
+    async def _iter_prefetched(
+        self,
+        method: str,
+        access_token: str,
+        requests: List[Dict],
+        prefetch: Optional[int] = None
+    ) -> AsyncIterator[Tuple[Dict, Any]]:
+        """Ответы на вызовы по порядку; следующие уже загружаются, пока обрабатывается текущий"""
+        prefetch = settings.VK_PREFETCH_PAGES if prefetch is None else prefetch
+        params_iter = iter(requests)
+        pending = deque()
         
-        # Ограничение скорости запросов
-        await asyncio.sleep(1.0 / settings.VK_API_REQUESTS_PER_SECOND)
+        def start_next():
+            params = next(params_iter, None)
+            if params is not None:
+                pending.append((params, asyncio.ensure_future(self.call(method, access_token, **params))))
         
-        session = await self.get_session()
         try:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if 'response' in data:
-                        return data['response']
-                    else:
-                        logger.error(f"VK Ads API error: {data}")
-                        return None
-        except Exception as e:
-            logger.error(f"VK Ads API request error: {e}")
-            return None
+            for _ in range(prefetch + 1):
+                start_next()
+            index = 0
+            while pending:
+                params, task = pending.popleft()
+                response = await task
+                start_next()
+                if response is None:
+                    raise VKAPIError(f"{method} failed (part {index + 1} of {len(requests)})")
+                yield params, response
+                index += 1
+        finally:
+            # Генератор закрыт раньше времени - лишние запросы не нужны
+            for _, task in pending:
+                task.cancel()
+    
+    async def iter_pages(
+        self,
+        method: str,
+        access_token: str,
+        page_size: int = ADS_PAGE_SIZE,
+        **params
+    ) -> AsyncIterator[List[Dict]]:
+        """Постраничная загрузка методов с offset/limit; следующая страница запрашивается заранее"""
+        offset = 0
+        next_page = asyncio.ensure_future(self.call(method, access_token, offset=offset, limit=page_size, **params))
+        try:
+            while next_page is not None:
+                response = await next_page
+                next_page = None
+                if response is None:
+                    raise VKAPIError(f"{method} failed at offset {offset}")
+                items = response.get('items', []) if isinstance(response, dict) else response
+                offset += page_size
+                if len(items) >= page_size:
+                    next_page = asyncio.ensure_future(
+                        self.call(method, access_token, offset=offset, limit=page_size, **params)
+                    )
+                if items:
+                    yield items
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+    
+    def iter_ads(
+        self,
+        access_token: str,
+        account_id: int,
+        campaign_ids: Optional[List[int]] = None,
+        client_id: Optional[int] = None
+    ) -> AsyncIterator[List[Dict]]:
+        """Объявления аккаунта страницами по ADS_PAGE_SIZE"""
+        params = {'account_id': account_id, 'include_deleted': 1}
+        if campaign_ids:
+            params['campaign_ids'] = json_codec.dumps(campaign_ids)
+        if client_id:
+            params['client_id'] = client_id
+        return self.iter_pages('ads.getAds', access_token, **params)
+    
+    async def iter_campaigns(
+        self,
+        access_token: str,
+        account_id: int,
+        client_ids: Optional[List[int]] = None
+    ) -> AsyncIterator[List[Dict]]:
+        """Кампании аккаунта: одна страница, у агентских - по странице на клиента (с client_id)"""
+        requests = [{'account_id': account_id, 'include_deleted': 1}]
+        if client_ids is not None:
+            requests = [{**requests[0], 'client_id': client_id} for client_id in client_ids]
+        
+        async for params, campaigns in self._iter_prefetched('ads.getCampaigns', access_token, requests):
+            client_id = params.get('client_id')
+            if client_id:
+                campaigns = [{**campaign, 'client_id': client_id} for campaign in campaigns]
+            yield campaigns
+    
+    async def iter_statistics(
+        self,
+        access_token: str,
+        account_id: int,
+        ids: List[int],
+        date_from: str,
+        date_to: str,
+        ids_type: str = 'campaign',
+        period: str = 'day'
+    ) -> AsyncIterator[List[Dict]]:
+        """Статистика частями по STATISTICS_MAX_IDS id: в памяти одна-две части, а не весь аккаунт"""
+        requests = [
+            {
+                'account_id': account_id,
+                'ids_type': ids_type,
+                'ids': ','.join(map(str, ids[i:i + STATISTICS_MAX_IDS])),
+                'period': period,
+                'date_from': date_from,
+                'date_to': date_to,
+            }
+            for i in range(0, len(ids), STATISTICS_MAX_IDS)
+        ]
+        async for _, items in self._iter_prefetched('ads.getStatistics', access_token, requests):
+            yield items
 
 # Глобальный экземпляр сервиса
-vk_service = VKService()
\ No newline at end of file
+vk_service = VKService()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Воркер, проживший меньше этого времени, считается упавшим при старте
+QUICK_CRASH_SECONDS = 10.0
+
+class _WorkerSlot:
+    __slots__ = ('index', 'process', 'started_at', 'backoff', 'restart_at')
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.backoff = 1.0
+        self.restart_at = 0.0
+
+class Supervisor:
+    """
+    Запуск N процессов-воркеров, слушающих один порт (SO_REUSEPORT),
+    и перезапуск упавших с нарастающей задержкой.
+    """
+
+    def __init__(
+        self,
+        target: Callable[[int], None],
+        workers: int,
+        max_backoff: float = 30.0,
+        preload: Sequence[str] = ()
+    ):
+        self.target = target
+        self.workers = workers
+        self.max_backoff = max_backoff
+        self.restarts = 0
+        if preload and "forkserver" in multiprocessing.get_all_start_methods():
+            # Тяжелые модули импортируются один раз в fork-сервере, воркеры получают их готовыми
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(list(preload))
+        else:
+            self._context = multiprocessing.get_context("spawn")
+        self._slots: List[_WorkerSlot] = [_WorkerSlot(i) for i in range(workers)]
+        self._stopping = asyncio.Event()
+
+    def _spawn(self, slot: _WorkerSlot):
+        process = self._context.Process(
+            target=self.target, args=(slot.index,), name=f"worker-{slot.index}", daemon=False
+        )
+        process.start()
+        slot.process = process
+        slot.started_at = time.monotonic()
+        logger.info(f"Worker {slot.index} started (pid {process.pid})")
+
+    def stop(self):
+        """Запрос на остановку всех воркеров"""
+        self._stopping.set()
+
+    async def run(self):
+        """Запуск воркеров и наблюдение за ними до остановки"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+        
+        for slot in self._slots:
+            self._spawn(slot)
+        
+        try:
+            while not self._stopping.is_set():
+                self._check_workers()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self._shutdown()
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for slot in self._slots:
+            process = slot.process
+            if process is not None and process.is_alive():
+                if now - slot.started_at > QUICK_CRASH_SECONDS:
+                    slot.backoff = 1.0
+                continue
+            
+            if process is not None:
+                logger.error(f"Worker {slot.index} exited with code {process.exitcode}")
+                process.close()
+                slot.process = None
+                # Постоянно падающий воркер перезапускаем все реже
+                if now - slot.started_at < QUICK_CRASH_SECONDS:
+                    slot.backoff = min(slot.backoff * 2, self.max_backoff)
+                slot.restart_at = now + slot.backoff
+            
+            if now >= slot.restart_at:
+                self.restarts += 1
+                self._spawn(slot)
+
+    async def _shutdown(self, timeout: float = 15.0):
+        running = [slot.process for slot in self._slots if slot.process is not None and slot.process.is_alive()]
+        for process in running:
+            process.terminate()
+        
+        deadline = time.monotonic() + timeout
+        for process in running:
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker pid {process.pid} did not stop in time, killing")
+                process.kill()
+                await asyncio.to_thread(process.join)
+        logger.info("All workers stopped")
@@ -3,7 +3,12 @@ from aiohttp.web import Request, Response
 import logging
 from app.services.vk_service import vk_service
 from app.services.user_service import user_service
-from app.core.database import async_session
+from app.services.token_health import token_health_service
+from app.services.export_service import export_service
+from app.services.chart_service import chart_service
+from app.core.database import async_session, get_pool_stats
+from app.core.metrics import registry, loop_lag_monitor, worker_metrics
+from app.bot.outbox import outbox
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +53,8 @@ async def vk_callback_handler(request: Request) -> Response:
             )
         
         if success:
+            # Имя VK для статуса подтянется фоновой проверкой, редирект ее не ждет
+            token_health_service.schedule_user(telegram_user_id, access_token)
             return web.Response(
                 text="""
                 ✅ Успешная авторизация!
@@ -55,7 +62,8 @@ async def vk_callback_handler(request: Request) -> Response:
                 Ваш VK аккаунт подключен к боту.
                 Теперь вы можете вернуться в Telegram и использовать команду /status
                 """,
-                content_type='text/plain; charset=utf-8'
+                content_type='text/plain',
+                charset='utf-8'
             )
         else:
             return web.Response(
@@ -70,8 +78,26 @@ async def vk_callback_handler(request: Request) -> Response:
             status=500
         )
 
+async def metrics_handler(request: Request) -> Response:
+    """Метрики в текстовом формате Prometheus (при нескольких воркерах - всех, с меткой worker)"""
+    return web.Response(
+        text=await worker_metrics.render(),
+        content_type='text/plain',
+        charset='utf-8'
+    )
+
 # Создание веб-приложения
 def create_app():
     app = web.Application()
     app.router.add_get('/vk-callback', vk_callback_handler)
+    app.router.add_get('/metrics', metrics_handler)
+    
+    registry.register_stats("vk_cache", "Попадания и промахи кэша VK", vk_service.cache.stats)
+    registry.register_stats("vk_http", "Соединения, повторы и размыкатель VK", vk_service.stats)
+    registry.register_stats("db_pool", "Состояние пула соединений БД", get_pool_stats)
+    registry.register_stats("outbox", "Счетчики очереди исходящих сообщений", outbox.stats)
+    registry.register_stats("export", "Выгрузки файлов и дисковый кэш", export_service.stats)
+    registry.register_stats("charts", "Графики отчета и дисковый кэш", chart_service.stats)
+    app.on_startup.append(loop_lag_monitor.start)
+    app.on_cleanup.append(loop_lag_monitor.stop)
     return app
\ No newline at end of file
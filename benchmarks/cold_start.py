@@ -0,0 +1,84 @@
+"""
+Время холодного старта бота: от запуска процесса до первого принятого webhook и первого ответа.
+
+Бот запускается в режиме webhook против заглушек из benchmarks.fakes, несколько раз подряд.
+
+Запуск (нужны DATABASE_URL, SECRET_KEY и остальные переменные окружения бота):
+    python -m benchmarks.cold_start --runs 5
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from aiohttp import ClientSession, ClientError, web
+from benchmarks.fakes import FakeVK, FakeTelegram, create_fake_app
+from benchmarks.load_test import BENCH_USER_ID_BASE, LoadTest, start_bot, stop_bot, cleanup
+from benchmarks.utils import print_table
+
+def measure_import() -> float:
+    """Импорт main в чистом процессе, сек"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import main'], check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+async def measure_start(http: ClientSession, load_test: LoadTest, telegram: FakeTelegram, port: int, fakes_url: str) -> dict:
+    user_id = BENCH_USER_ID_BASE
+    started = time.perf_counter()
+    process = start_bot(port, fakes_url, quiet=True)
+    try:
+        reply = telegram.wait_reply(user_id)
+        # Опрашиваем /webhook, пока бот не начнет принимать апдейты
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Бот завершился с кодом {process.returncode}")
+            try:
+                update = load_test.message_update(user_id, '/start')
+                async with http.post(f"{load_test.bot_url}/webhook", json=update) as response:
+                    if response.status == 200:
+                        break
+            except ClientError:
+                pass
+            await asyncio.sleep(0.02)
+        accepted = time.perf_counter()
+        replied = await asyncio.wait_for(reply, 30)
+        return {
+            'webhook_ms': (accepted - started) * 1000,
+            'first_reply_ms': (replied - started) * 1000,
+        }
+    finally:
+        stop_bot(process)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--fakes-port', type=int, default=8081)
+    parser.add_argument('--bot-port', type=int, default=8090)
+    args = parser.parse_args()
+
+    telegram = FakeTelegram()
+    runner = web.AppRunner(create_fake_app(FakeVK(), telegram), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.fakes_port).start()
+    fakes_url = f"http://127.0.0.1:{args.fakes_port}"
+    bot_url = f"http://127.0.0.1:{args.bot_port}"
+
+    rows = []
+    try:
+        async with ClientSession() as http:
+            load_test = LoadTest(http, bot_url, telegram, None, timeout=30)
+            for run in range(args.runs):
+                import_seconds = await asyncio.to_thread(measure_import)
+                rows.append({
+                    'run': run + 1,
+                    'import_ms': import_seconds * 1000,
+                    **await measure_start(http, load_test, telegram, args.bot_port, fakes_url),
+                })
+    finally:
+        await runner.cleanup()
+        await cleanup([BENCH_USER_ID_BASE])
+
+    print_table(rows)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Задержка обработчика с пулом соединений и без него.
+
+Запуск (нужен доступный DATABASE_URL):
+    python -m benchmarks.db_pool --requests 1000 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.core.database import async_session, build_engine
+from app.core.migrations import migrate
+from app.models.user import User
+from app.services.user_service import UserService
+from benchmarks.utils import summarize, print_table
+
+# Диапазон Telegram id, не пересекающийся с реальными пользователями
+BENCH_USER_ID_BASE = 2_000_000_000
+BENCH_USERS = 100
+
+async def run_mode(pool_mode: str, requests: int, concurrency: int) -> dict:
+    engine = build_engine(pool_mode)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def handler(i: int):
+        # Та же работа с БД, что у /start и check_status
+        async with semaphore:
+            started = time.perf_counter()
+            async with session_factory() as session:
+                user_id = BENCH_USER_ID_BASE + i % BENCH_USERS
+                await UserService.get_or_create_user(session, user_id)
+                await UserService.get_user_by_telegram_id(session, user_id)
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+    return {'pool': pool_mode, **summarize(latencies, elapsed)}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+    
+    await migrate()
+    rows = [
+        await run_mode(mode, args.requests, args.concurrency)
+        for mode in ("null", "queue")
+    ]
+    print_table(rows)
+    
+    # Удаляем тестовых пользователей
+    async with async_session() as session:
+        await session.execute(delete(User).where(User.user_id.between(BENCH_USER_ID_BASE, BENCH_USER_ID_BASE + BENCH_USERS - 1)))
+        await session.commit()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,301 @@
+"""
+Локальные заглушки VK API, VK OAuth и Telegram Bot API для нагрузочных тестов.
+
+Отдельный запуск (например, чтобы направить на них уже работающего бота):
+    python -m benchmarks.fakes --port 8081 --vk-latency 0.05 --vk-error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Set
+from aiohttp import web
+
+# Ошибки VK "User authorization failed" и "Too many requests per second"
+VK_ERROR_AUTH = 5
+VK_ERROR_TOO_MANY_REQUESTS = 6
+
+def _seed(*parts) -> int:
+    """Детерминированное число из параметров, чтобы ответы VK были стабильны между прогонами"""
+    return int.from_bytes(hashlib.blake2b(repr(parts).encode(), digest_size=4).digest(), 'big')
+
+class FakeVK:
+    """api.vk.com и oauth.vk.com: синтетические аккаунты, кампании и статистика"""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        error_rate: float = 0.0,
+        accounts: int = 2,
+        campaigns: int = 5,
+        ads_per_campaign: int = 3,
+        revoked_share: float = 0.0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.accounts = accounts
+        self.campaigns = campaigns
+        self.ads_per_campaign = ads_per_campaign
+        self.revoked_share = revoked_share
+        # HTTP запросы по методам (execute считается одним запросом) и вызовы внутри execute
+        self.requests: Counter = Counter()
+        self.calls: Counter = Counter()
+        # Отозванные токены: любой вызов с ними - ошибка авторизации
+        self.revoked: Set[str] = set()
+
+    def setup(self, app: web.Application):
+        app.router.add_route('*', '/method/{method}', self.method_handler)
+        app.router.add_get('/access_token', self.oauth_handler)
+
+    async def _delay(self):
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    async def oauth_handler(self, request: web.Request) -> web.Response:
+        await self._delay()
+        self.requests['oauth.access_token'] += 1
+        code = request.query.get('code', '')
+        token = f"bench-token-{code}"
+        # Доля выданных токенов сразу отозвана (пользователь закрыл доступ) - одни и те же между прогонами
+        if _seed('revoked', code) % 10_000 < self.revoked_share * 10_000:
+            self.revoked.add(token)
+        return web.json_response({
+            'access_token': token,
+            'expires_in': 0,
+            'user_id': _seed('vk_user', code) % 10_000_000,
+        })
+
+    async def method_handler(self, request: web.Request) -> web.Response:
+        await self._delay()
+        method = request.match_info['method']
+        params = dict(request.query)
+        if request.method == 'POST':
+            params.update(await request.post())
+        self.requests[method] += 1
+
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response({'error': {
+                'error_code': VK_ERROR_TOO_MANY_REQUESTS,
+                'error_msg': 'Too many requests per second',
+            }})
+
+        token = params.get('access_token', '')
+        if token in self.revoked:
+            return web.json_response({'error': {
+                'error_code': VK_ERROR_AUTH,
+                'error_msg': 'User authorization failed: invalid access_token',
+            }})
+        if method == 'execute':
+            return web.json_response(self.execute(token, params.get('code', '')))
+
+        result = self.dispatch(method, token, params)
+        if result is None:
+            return web.json_response({'error': {'error_code': 3, 'error_msg': 'Unknown method passed'}})
+        return web.json_response({'response': result})
+
+    def execute(self, token: str, code: str) -> Dict:
+        """Разбор VKScript вида return [API.method({...}), ...]; из VKBatcher.build_code"""
+        decoder = json.JSONDecoder()
+        results, errors = [], []
+        position = code.find('API.')
+        while position != -1:
+            start = position + len('API.')
+            paren = code.index('(', start)
+            method = code[start:paren]
+            params, end = decoder.raw_decode(code, paren + 1)
+            self.calls[method] += 1
+            result = self.dispatch(method, token, {key: str(value) for key, value in params.items()})
+            if result is None:
+                results.append(False)
+                errors.append({'method': method, 'error_code': 3, 'error_msg': 'Unknown method passed'})
+            else:
+                results.append(result)
+            position = code.find('API.', end)
+
+        response = {'response': results}
+        if errors:
+            response['execute_errors'] = errors
+        return response
+
+    def dispatch(self, method: str, token: str, params: Dict[str, str]) -> Optional[object]:
+        handler = {
+            'users.get': self.users_get,
+            'ads.getAccounts': self.get_accounts,
+            'ads.getClients': self.get_clients,
+            'ads.getCampaigns': self.get_campaigns,
+            'ads.getStatistics': self.get_statistics,
+            'ads.getAds': self.get_ads,
+        }.get(method)
+        return handler(token, params) if handler else None
+
+    def users_get(self, token: str, params: Dict[str, str]) -> List[Dict]:
+        return [{'id': _seed('vk_user', token) % 10_000_000, 'first_name': 'Bench', 'last_name': 'User'}]
+
+    def get_accounts(self, token: str, params: Dict[str, str]) -> List[Dict]:
+        base = _seed('account', token) % 1_000_000 * 100
+        return [
+            {
+                'account_id': base + i,
+                'account_name': f"Bench account {i + 1}",
+                'account_type': 'general',
+                'account_status': 1,
+                'access_role': 'admin',
+            }
+            for i in range(self.accounts)
+        ]
+
+    def get_clients(self, token: str, params: Dict[str, str]) -> List[Dict]:
+        return []
+
+    def get_campaigns(self, token: str, params: Dict[str, str]) -> List[Dict]:
+        account_id = int(params.get('account_id', 0))
+        return [
+            {
+                'id': account_id * 100 + i,
+                'name': f"Bench campaign {i + 1}",
+                'status': 1,
+                'day_limit': '1000',
+                'all_limit': '0',
+            }
+            for i in range(self.campaigns)
+        ]
+
+    def get_ads(self, token: str, params: Dict[str, str]) -> List[Dict]:
+        account_id = int(params.get('account_id', 0))
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 2000))
+        total = self.campaigns * self.ads_per_campaign
+        return [
+            {
+                'id': account_id * 10_000 + i,
+                'campaign_id': account_id * 100 + i // self.ads_per_campaign,
+                'name': f"Bench ad {i + 1}",
+                'status': 1,
+            }
+            for i in range(offset, min(offset + limit, total))
+        ]
+
+    def get_statistics(self, token: str, params: Dict[str, str]) -> List[Dict]:
+        ids = [int(value) for value in params.get('ids', '').split(',') if value]
+        day_from = date.fromisoformat(params['date_from'])
+        day_to = date.fromisoformat(params['date_to'])
+        days = [day_from + timedelta(days=i) for i in range((day_to - day_from).days + 1)]
+
+        items = []
+        for campaign_id in ids:
+            stats = []
+            for day in days:
+                seed = _seed(campaign_id, day.isoformat())
+                impressions = 1000 + seed % 20000
+                clicks = impressions * (5 + seed % 20) // 1000
+                stats.append({
+                    'day': day.isoformat(),
+                    'impressions': impressions,
+                    'clicks': clicks,
+                    'reach': impressions * 3 // 4,
+                    'goals': clicks // 10,
+                    'spent': f"{impressions * 0.12:.2f}",
+                })
+            items.append({'id': campaign_id, 'type': params.get('ids_type', 'campaign'), 'stats': stats})
+        return items
+
+class FakeTelegram:
+    """Bot API: принимает любые методы и сообщает о доставке ответов пользователям"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests: Counter = Counter()
+        self.uploaded_bytes = 0
+        self._message_id = 0
+        # chat_id -> ожидающие ответа на апдейт
+        self._waiters: Dict[int, List[asyncio.Future]] = {}
+
+    def setup(self, app: web.Application):
+        app.router.add_post('/bot{token}/{method}', self.method_handler)
+
+    def wait_reply(self, chat_id: int) -> asyncio.Future:
+        """Будущее, которое завершится при следующем ответе пользователю с клавиатурой"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append(future)
+        return future
+
+    def _resolve(self, chat_id: int):
+        for future in self._waiters.pop(chat_id, []):
+            if not future.done():
+                future.set_result(time.perf_counter())
+
+    async def method_handler(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        method = request.match_info['method']
+        self.requests[method] += 1
+        data = await request.post()
+
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot',
+            }})
+        if method not in ('sendMessage', 'sendDocument', 'sendPhoto', 'editMessageText'):
+            return web.json_response({'ok': True, 'result': True})
+
+        chat_id = int(data.get('chat_id', 0))
+        upload = data.get('document', data.get('photo'))
+        if isinstance(upload, web.FileField):
+            self.uploaded_bytes += len(upload.file.read())
+        if method != 'editMessageText':
+            self._message_id += 1
+            message_id = self._message_id
+        else:
+            message_id = int(data.get('message_id', 0))
+
+        # Промежуточные статусы идут без клавиатуры, итоговый ответ - всегда с ней
+        if data.get('reply_markup'):
+            self._resolve(chat_id)
+
+        return web.json_response({'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'first_name': 'Bench'},
+            'text': data.get('text', data.get('caption', '')),
+        }})
+
+def create_fake_app(vk: FakeVK, telegram: FakeTelegram) -> web.Application:
+    """Одно приложение со всеми заглушками: /method, /access_token, /bot<token>/<method>"""
+    # Выгрузки отчетов приходят файлами: поднимаем лимит тела запроса с 1 МБ до лимита Bot API
+    app = web.Application(client_max_size=50 * 1024 * 1024)
+    vk.setup(app)
+    telegram.setup(app)
+    return app
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--vk-latency', type=float, default=0.05)
+    parser.add_argument('--vk-error-rate', type=float, default=0.0)
+    parser.add_argument('--vk-revoked-share', type=float, default=0.0, help="Доля выдаваемых токенов, сразу отозванных")
+    parser.add_argument('--telegram-latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = create_fake_app(
+        FakeVK(latency=args.vk_latency, error_rate=args.vk_error_rate, revoked_share=args.vk_revoked_share),
+        FakeTelegram(latency=args.telegram_latency)
+    )
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    base = f"http://{args.host}:{args.port}"
+    print(f"VK_API_URL={base}/method VK_OAUTH_URL={base} TELEGRAM_API_URL={base}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(main())
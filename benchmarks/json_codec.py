@@ -0,0 +1,71 @@
+"""
+Разбор и сериализация JSON: app.core.json_codec против стандартного json.
+
+Ответы ads.getStatistics берутся из заглушки benchmarks.fakes (кампании x дни).
+Базовый вариант повторяет aiohttp response.json(): байты -> str -> json.loads.
+
+Запуск:
+    python -m benchmarks.json_codec --campaigns 100,2000 --days 30
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+from app.core import json_codec
+from benchmarks.fakes import FakeVK
+from benchmarks.utils import print_table
+
+def make_payload(campaigns: int, days: int) -> bytes:
+    """Тело ответа ads.getStatistics в том виде, в каком его отдает VK"""
+    day_to = date.today()
+    params = {
+        'ids': ','.join(str(campaign_id) for campaign_id in range(1, campaigns + 1)),
+        'date_from': (day_to - timedelta(days=days - 1)).isoformat(),
+        'date_to': day_to.isoformat(),
+    }
+    return json.dumps({'response': FakeVK().get_statistics('bench', params)}).encode('utf-8')
+
+def stdlib_loads(raw: bytes):
+    return json.loads(raw.decode('utf-8'))
+
+def timed(func, value, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(value)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--campaigns', default='100,2000', help="Размеры ответа через запятую")
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for campaigns in (int(value) for value in args.campaigns.split(',')):
+        raw = make_payload(campaigns, args.days)
+        data = json.loads(raw)
+        cases = (
+            ('loads', stdlib_loads, json_codec.loads, raw),
+            # aiogram по умолчанию сериализует через json.dumps
+            ('dumps', json.dumps, json_codec.dumps, data),
+        )
+        for operation, baseline, codec, value in cases:
+            baseline_seconds = timed(baseline, value, args.repeat)
+            codec_seconds = timed(codec, value, args.repeat)
+            rows.append({
+                'operation': operation,
+                'campaigns': campaigns,
+                'size_kb': len(raw) / 1024,
+                'json_ms': baseline_seconds * 1000,
+                'codec_ms': codec_seconds * 1000,
+                'speedup': baseline_seconds / codec_seconds,
+            })
+
+    print(f"Реализация app.core.json_codec: {json_codec.BACKEND}")
+    print_table(rows)
+
+if __name__ == "__main__":
+    main()
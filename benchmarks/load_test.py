@@ -0,0 +1,267 @@
+"""
+Нагрузочный тест бота целиком: бот запускается отдельным процессом в режиме webhook,
+VK и Telegram подменяются локальными заглушками (benchmarks.fakes).
+
+Сценарии по порядку: /start, OAuth редирект в /vk-callback, check_status, get_report.
+Любая другая кнопка задается своим callback_data, например --scenarios ...,get_report,export:xlsx.
+Задержка апдейта - от POST в /webhook до итогового ответа бота в заглушке Telegram.
+Счетчики запросов к БД и VK берутся из /metrics бота.
+
+Запуск (нужны DATABASE_URL, SECRET_KEY и остальные переменные окружения бота):
+    python -m benchmarks.load_test --users 200 --rounds 5 --vk-latency 0.05
+
+--vk-revoked-share 0.2 - часть токенов VK отзывает сразу после выдачи: фоновая проверка
+помечает их недействительными, а статус и отчеты идут по ветке отозванного токена.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+from aiohttp import ClientSession, ClientTimeout, web
+from benchmarks.fakes import FakeVK, FakeTelegram, create_fake_app
+from benchmarks.utils import summarize, print_table
+
+# Диапазон Telegram id (users.user_id - INTEGER), не пересекающийся с benchmarks.db_pool
+BENCH_USER_ID_BASE = 2_100_000_000
+BENCH_BOT_TOKEN = "123456:bench-token"
+METRIC_COUNTERS = {
+    'db_queries': 'db_query_duration_seconds_count',
+    'vk_calls': 'vk_request_duration_seconds_count',
+}
+
+def parse_counters(text: str) -> Dict[str, float]:
+    """Сумма значений по всем меткам для нужных метрик из ответа /metrics"""
+    totals = {key: 0.0 for key in METRIC_COUNTERS}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        name = line.split('{', 1)[0].split(' ', 1)[0]
+        for key, metric in METRIC_COUNTERS.items():
+            if name == metric:
+                totals[key] += float(line.rsplit(' ', 1)[1])
+    return totals
+
+class LoadTest:
+    def __init__(self, http: ClientSession, bot_url: str, telegram: FakeTelegram, vk: FakeVK, timeout: float):
+        self.http = http
+        self.bot_url = bot_url
+        self.telegram = telegram
+        self.vk = vk
+        self.timeout = timeout
+        self.update_id = 0
+
+    def _user(self, user_id: int) -> Dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': 'Bench', 'language_code': 'ru'}
+
+    def message_update(self, user_id: int, text: str) -> Dict:
+        self.update_id += 1
+        return {'update_id': self.update_id, 'message': {
+            'message_id': self.update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            'text': text,
+        }}
+
+    def callback_update(self, user_id: int, data: str) -> Dict:
+        self.update_id += 1
+        # Свое сообщение на каждый апдейт: иначе outbox пропустит правку с тем же текстом
+        return {'update_id': self.update_id, 'callback_query': {
+            'id': str(self.update_id),
+            'from': self._user(user_id),
+            'chat_instance': 'bench',
+            'data': data,
+            'message': {
+                'message_id': self.update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': 1, 'is_bot': True, 'first_name': 'Bench'},
+                'text': 'bench',
+            },
+        }}
+
+    async def metrics(self) -> Dict[str, float]:
+        async with self.http.get(f"{self.bot_url}/metrics") as response:
+            return parse_counters(await response.text())
+
+    async def send_update(self, user_id: int, update: Dict, latencies: List[float], acks: List[float]) -> bool:
+        reply = self.telegram.wait_reply(user_id)
+        started = time.perf_counter()
+        async with self.http.post(f"{self.bot_url}/webhook", json=update) as response:
+            acks.append(time.perf_counter() - started)
+            if response.status != 200:
+                reply.cancel()
+                return False
+        try:
+            finished = await asyncio.wait_for(reply, self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        latencies.append(finished - started)
+        return True
+
+    async def oauth_redirect(self, user_id: int, latencies: List[float], acks: List[float]) -> bool:
+        started = time.perf_counter()
+        params = {'code': f"bench-{user_id}", 'state': str(user_id)}
+        async with self.http.get(f"{self.bot_url}/vk-callback", params=params) as response:
+            await response.read()
+            ok = response.status == 200
+        latencies.append(time.perf_counter() - started)
+        acks.append(latencies[-1])
+        return ok
+
+    async def scenario(self, name: str, users: List[int], rounds: int) -> Dict[str, object]:
+        latencies, acks = [], []
+        failed = 0
+
+        async def run_user(user_id: int):
+            nonlocal failed
+            # Апдейты одного пользователя идут последовательно, как в реальном чате
+            for _ in range(rounds):
+                if name == 'start':
+                    ok = await self.send_update(user_id, self.message_update(user_id, '/start'), latencies, acks)
+                elif name == 'oauth':
+                    ok = await self.oauth_redirect(user_id, latencies, acks)
+                else:
+                    ok = await self.send_update(user_id, self.callback_update(user_id, name), latencies, acks)
+                failed += not ok
+
+        metrics_before = await self.metrics()
+        vk_before = sum(self.vk.requests.values())
+        telegram_before = sum(self.telegram.requests.values())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user(user_id) for user_id in users))
+        elapsed = time.perf_counter() - started
+
+        metrics_after = await self.metrics()
+        summary = summarize(latencies, elapsed)
+        return {
+            'scenario': name,
+            **summary,
+            'failed': failed,
+            'ack_p99_ms': summarize(acks, elapsed)['p99_ms'],
+            'db_queries': int(metrics_after['db_queries'] - metrics_before['db_queries']),
+            'vk_calls': int(metrics_after['vk_calls'] - metrics_before['vk_calls']),
+            'vk_http': sum(self.vk.requests.values()) - vk_before,
+            'tg_calls': sum(self.telegram.requests.values()) - telegram_before,
+        }
+
+def start_bot(port: int, fakes_url: str, quiet: bool) -> subprocess.Popen:
+    """Бот в режиме webhook, направленный на заглушки"""
+    env = dict(
+        os.environ,
+        DEBUG='False',
+        BOT_TOKEN=BENCH_BOT_TOKEN,
+        WEB_HOST='127.0.0.1',
+        WEB_PORT=str(port),
+        WEB_WORKERS='1',
+        VK_REDIRECT_URI=f"http://127.0.0.1:{port}/vk-callback",
+        TELEGRAM_API_URL=fakes_url,
+        VK_API_URL=f"{fakes_url}/method",
+        VK_OAUTH_URL=fakes_url,
+        # Сценарии нажимают одни и те же кнопки подряд: замеряем полный путь, а не отсечку дублей
+        CALLBACK_RATE='1000',
+        CALLBACK_BURST='1000',
+        CALLBACK_COALESCE_WINDOW='0',
+    )
+    output = subprocess.DEVNULL if quiet else None
+    return subprocess.Popen([sys.executable, 'main.py'], env=env, stdout=output, stderr=output)
+
+def stop_bot(process: subprocess.Popen):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+async def wait_ready(http: ClientSession, bot_url: str, process: Optional[subprocess.Popen], timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Бот завершился с кодом {process.returncode}")
+        try:
+            async with http.get(f"{bot_url}/metrics") as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Бот не ответил на /metrics")
+
+async def cleanup(users: List[int]):
+    """Удаление тестовых пользователей и загруженной для них статистики"""
+    from sqlalchemy import delete, select
+    from app.core.database import async_session, close_db
+    from app.models.user import User
+    from app.models.statistics import AdAccount, Campaign, CampaignStat, SyncState
+
+    async with async_session() as session:
+        account_ids = select(AdAccount.account_id).where(AdAccount.user_id.in_(users))
+        for model in (CampaignStat, Campaign, SyncState):
+            await session.execute(delete(model).where(model.account_id.in_(account_ids)))
+        await session.execute(delete(AdAccount).where(AdAccount.user_id.in_(users)))
+        await session.execute(delete(User).where(User.user_id.in_(users)))
+        await session.commit()
+    await close_db()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30.0, help="Ожидание ответа на апдейт, сек")
+    parser.add_argument('--vk-latency', type=float, default=0.05)
+    parser.add_argument('--vk-error-rate', type=float, default=0.0)
+    parser.add_argument('--vk-revoked-share', type=float, default=0.0, help="Доля токенов, отозванных сразу после выдачи")
+    parser.add_argument('--telegram-latency', type=float, default=0.0)
+    parser.add_argument('--fakes-port', type=int, default=8081)
+    parser.add_argument('--bot-port', type=int, default=8090)
+    parser.add_argument('--bot-url', help="Уже запущенный бот, направленный на заглушки (процесс не запускается)")
+    parser.add_argument('--scenarios', default='start,oauth,check_status,get_report')
+    parser.add_argument('--keep-data', action='store_true', help="Не удалять тестовых пользователей")
+    parser.add_argument('--verbose', action='store_true', help="Показывать вывод бота")
+    args = parser.parse_args()
+
+    vk = FakeVK(latency=args.vk_latency, error_rate=args.vk_error_rate, revoked_share=args.vk_revoked_share)
+    telegram = FakeTelegram(latency=args.telegram_latency)
+    runner = web.AppRunner(create_fake_app(vk, telegram), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.fakes_port).start()
+    fakes_url = f"http://127.0.0.1:{args.fakes_port}"
+
+    process = None
+    bot_url = args.bot_url
+    if bot_url is None:
+        process = start_bot(args.bot_port, fakes_url, quiet=not args.verbose)
+        bot_url = f"http://127.0.0.1:{args.bot_port}"
+
+    users = [BENCH_USER_ID_BASE + i for i in range(args.users)]
+    rows = []
+    try:
+        async with ClientSession(timeout=ClientTimeout(total=args.timeout)) as http:
+            await wait_ready(http, bot_url, process)
+            load_test = LoadTest(http, bot_url, telegram, vk, args.timeout)
+            for name in args.scenarios.split(','):
+                # OAuth нужен один раз на пользователя
+                rounds = 1 if name == 'oauth' else args.rounds
+                rows.append(await load_test.scenario(name, users, rounds))
+    finally:
+        if process is not None:
+            stop_bot(process)
+        await runner.cleanup()
+        if not args.keep_data:
+            await cleanup(users)
+
+    print_table(rows)
+    print(f"VK HTTP запросы по методам: {dict(vk.requests)}")
+    print(f"Вызовы внутри execute: {dict(vk.calls)}")
+    print(f"Telegram: {dict(telegram.requests)}")
+    if vk.revoked:
+        print(f"Отозванных токенов: {len(vk.revoked)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Рекомендации по оптимизации на большом числе кампаний: время и пиковая память.
+
+Статистика синтетическая (benchmarks.report_engine.make_frame) за период истории движка,
+у части кампаний задан дневной лимит.
+
+Запуск:
+    python -m benchmarks.recommendations --campaigns 1000,10000,100000
+"""
+import argparse
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, timedelta
+import numpy as np
+from app.services.recommendations import HISTORY_DAYS, KINDS, find_recommendations
+from benchmarks.report_engine import make_frame
+from benchmarks.utils import print_table
+
+def make_limits(campaigns: int, seed: int = 42) -> np.ndarray:
+    """Дневные лимиты: у половины кампаний лимита нет"""
+    rng = np.random.default_rng(seed)
+    limits = rng.uniform(1000, 30000, size=campaigns)
+    limits[rng.random(campaigns) < 0.5] = np.nan
+    return limits
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--campaigns', default='1000,10000,100000', help="Число кампаний через запятую")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # make_frame заканчивает период вчерашним днем
+    date_to = date.today() - timedelta(days=1)
+    rows = []
+    for campaigns in (int(value) for value in args.campaigns.split(',')):
+        frame = make_frame(args.accounts, campaigns, HISTORY_DAYS)
+        campaign_ids = np.arange(1, campaigns + 1)
+        limits = make_limits(campaigns)
+
+        best = float('inf')
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            found = find_recommendations(frame, campaign_ids, limits, date_to)
+            best = min(best, time.perf_counter() - started)
+
+        tracemalloc.start()
+        find_recommendations(frame, campaign_ids, limits, date_to)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        kinds = Counter(KINDS[kind] for kind in found['kind'].tolist())
+        rows.append({
+            'campaigns': campaigns,
+            'rows': len(frame),
+            'ms': best * 1000,
+            'rows_per_s': len(frame) / best,
+            'peak_mb': peak / 1024 / 1024,
+            'found': len(found['kind']),
+            **{kind: kinds.get(kind, 0) for kind in KINDS},
+        })
+
+    print_table(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Векторный движок отчетов против построчной агрегации на Python.
+
+Запуск:
+    python -m benchmarks.report_engine --campaigns 2000 --days 90
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+import numpy as np
+from app.services.report_engine import StatsFrame, aggregate, day_over_day
+from benchmarks.utils import print_table
+
+def make_frame(accounts: int, campaigns: int, days: int, seed: int = 42) -> StatsFrame:
+    """Синтетическая статистика: каждая кампания показывается каждый день"""
+    rng = np.random.default_rng(seed)
+    campaign_ids = np.arange(1, campaigns + 1)
+    start = np.datetime64(date.today() - timedelta(days=days), 'D')
+    day = np.repeat(start + np.arange(days), campaigns)
+    campaign = np.tile(campaign_ids, days)
+    impressions = rng.integers(0, 50000, size=len(day))
+    clicks = rng.binomial(impressions, 0.01)
+    return StatsFrame(
+        account_id=campaign % accounts + 1,
+        campaign_id=campaign,
+        day=day,
+        impressions=impressions,
+        clicks=clicks,
+        conversions=rng.binomial(clicks, 0.05),
+        spent=impressions * rng.uniform(0.05, 0.5, size=len(day)),
+    )
+
+def naive_report(rows):
+    """Та же агрегация построчным циклом со словарями"""
+    groups = {name: defaultdict(lambda: [0.0, 0.0, 0.0, 0.0]) for name in ('account', 'campaign', 'day', 'week')}
+    for account_id, campaign_id, day, impressions, clicks, conversions, spent in rows:
+        week = day - timedelta(days=day.weekday())
+        for name, key in (('account', account_id), ('campaign', campaign_id), ('day', day), ('week', week)):
+            totals = groups[name][key]
+            totals[0] += impressions
+            totals[1] += clicks
+            totals[2] += conversions
+            totals[3] += spent
+    result = {}
+    for name, group in groups.items():
+        metrics = {}
+        for key, (impressions, clicks, conversions, spent) in group.items():
+            metrics[key] = {
+                'ctr': clicks / impressions * 100 if impressions else 0.0,
+                'cpc': spent / clicks if clicks else 0.0,
+                'cpm': spent / impressions * 1000 if impressions else 0.0,
+                'cr': conversions / clicks * 100 if clicks else 0.0,
+            }
+        result[name] = metrics
+    days = sorted(result['day'])
+    spent_by_day = [groups['day'][day][3] for day in days]
+    result['dod'] = [
+        (current - previous) / previous * 100 if previous else None
+        for previous, current in zip(spent_by_day, spent_by_day[1:])
+    ]
+    return result
+
+def vectorized_report(frame: StatsFrame):
+    return {
+        **{name: aggregate(frame, name) for name in ('account', 'campaign', 'day', 'week')},
+        'dod': day_over_day(frame),
+    }
+
+def timed(func, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--campaigns', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=90)
+    args = parser.parse_args()
+    
+    frame = make_frame(args.accounts, args.campaigns, args.days)
+    rows = list(zip(
+        frame.account_id.tolist(),
+        frame.campaign_id.tolist(),
+        frame.day.tolist(),
+        frame.impressions.tolist(),
+        frame.clicks.tolist(),
+        frame.conversions.tolist(),
+        frame.spent.tolist(),
+    ))
+    
+    naive = timed(naive_report, rows, repeat=1)
+    vectorized = timed(vectorized_report, frame)
+    print_table([
+        {'engine': 'naive', 'rows': len(rows), 'ms': naive * 1000, 'speedup': 1.0},
+        {'engine': 'numpy', 'rows': len(rows), 'ms': vectorized * 1000, 'speedup': naive / vectorized},
+    ])
+
+if __name__ == "__main__":
+    main()
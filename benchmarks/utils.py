@@ -0,0 +1,39 @@
+import statistics
+from typing import Dict, List, Sequence
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Перцентиль по отсортированной выборке (ближайший ранг)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def summarize(latencies: Sequence[float], elapsed: float) -> Dict[str, float]:
+    """Сводка по задержкам (в мс) и пропускной способности"""
+    return {
+        'count': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+def print_table(rows: List[Dict[str, object]]):
+    """Вывод результатов в виде таблицы"""
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = {
+        column: max(len(column), *(len(_format(row[column])) for row in rows))
+        for column in columns
+    }
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(_format(row[column]).ljust(widths[column]) for column in columns))
+
+def _format(value: object) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
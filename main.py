@@ -1,42 +1,91 @@
 import asyncio
 import logging
-import sys
+import signal
 from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.webhook.aiohttp_server import setup_application
 
 from app.core.config import settings
-from app.core.database import create_tables, close_db
+from app.core import json_codec
+from app.core.database import close_db, get_pool_stats
+from app.core.migrations import migrate
 from app.bot.handlers.auth import router
 from app.web.vk_callback import create_app
+from app.core.redis_client import close_redis
 from app.services.vk_service import vk_service
+from app.services.export_service import export_service
+from app.services.chart_service import chart_service
+from app.services.user_service import user_cache_listener
+from app.services.activity import activity_tracker
+from app.bot.middlewares import ActivityMiddleware, CallbackThrottleMiddleware, HandlerMetricsMiddleware
+from app.bot.webhook import QueuedRequestHandler
+from app.core.metrics import registry, worker_metrics
+from app.core.logging_config import setup_logging, stop_logging, worker_log_file
 
-# Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log')
-    ]
-)
+# Настройка логирования: запись в файл и stdout идет в отдельном потоке
+setup_logging()
 
 logging.getLogger("aiogram").setLevel(logging.WARNING)
 logging.getLogger("aiohttp").setLevel(logging.WARNING)
 
 logger = logging.getLogger(__name__)
 
+# Сторонние модули без побочных эффектов, которые fork-сервер загружает заранее для воркеров
+WORKER_PRELOAD = [
+    'aiogram.types',
+    'aiogram.methods',
+    'aiohttp.web',
+    'sqlalchemy.ext.asyncio',
+    'sqlalchemy.dialects.postgresql.asyncpg',
+    'asyncpg',
+]
+
+def create_bot() -> Bot:
+    """Создание бота"""
+    session_options = {'json_loads': json_codec.loads, 'json_dumps': json_codec.dumps}
+    if settings.TELEGRAM_API_URL:
+        # Локальный Bot API сервер или заглушка для нагрузочных тестов
+        session_options['api'] = TelegramAPIServer.from_base(settings.TELEGRAM_API_URL)
+    session = AiohttpSession(**session_options)
+    return Bot(
+        token=settings.BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+def create_storage():
+    """Хранилище состояний: в памяти или общее для всех процессов в Redis"""
+    if settings.FSM_STORAGE == "redis":
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(settings.REDIS_URL)
+    from aiogram.fsm.storage.memory import MemoryStorage
+    return MemoryStorage()
+
+def get_webhook_url() -> str:
+    return f"{settings.VK_REDIRECT_URI.replace('/vk-callback', '/webhook')}"
+
 async def create_combined_app():
     """Создание объединенного приложения с ботом и веб-сервером"""
     
     # Создание бота
-    bot = Bot(
-        token=settings.BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    bot = create_bot()
+    dp = Dispatcher(storage=create_storage())
+    dp.update.outer_middleware(ActivityMiddleware())
+    # Inner middleware диспетчера распространяется на хендлеры всех вложенных роутеров
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    # Повторные нажатия кнопок не должны каждый раз проходить путь через БД и VK
+    callback_throttle = CallbackThrottleMiddleware(
+        rate=settings.CALLBACK_RATE,
+        burst=settings.CALLBACK_BURST,
+        window=settings.CALLBACK_COALESCE_WINDOW
     )
-    dp = Dispatcher()
+    router.callback_query.middleware(callback_throttle)
+    registry.register_stats("callback_throttle", "Счетчики нажатий inline кнопок", callback_throttle.stats)
     dp.include_router(router)
     
     # Создание веб-приложения
@@ -48,20 +97,36 @@ async def create_combined_app():
         return bot, dp, app
     else:
         # В продакшене - webhook
-        webhook_handler = SimpleRequestHandler(dispatcher=dp, bot=bot)
+        # Ответ Telegram сразу, обработка - в пуле воркеров с сохранением порядка по пользователю
+        webhook_handler = QueuedRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            workers=settings.WEBHOOK_WORKERS,
+            high_water=settings.WEBHOOK_QUEUE_HIGH_WATER
+        )
         webhook_handler.register(app, path="/webhook")
+        registry.register_stats("webhook_queue", "Счетчики очереди webhook", webhook_handler.stats)
         setup_application(app, dp, bot=bot)
         return bot, dp, app
 
 async def main():
+    scheduler = None
     try:
         # Инициализация БД
-        await create_tables()
-        logger.info("База данных инициализирована")
+        await migrate()
+        
+        if settings.USER_CACHE_NOTIFY:
+            await user_cache_listener.start()
+        await activity_tracker.start()
         
         # Создание приложения
         bot, dp, app = await create_combined_app()
         
+        # Планировщик нужен только главному процессу: воркеры его не импортируют
+        from app.services.scheduler import setup_scheduler
+        scheduler = setup_scheduler(bot)
+        scheduler.start()
+        
         if settings.DEBUG:
             # Режим разработки - запуск polling + веб-сервер
             logger.info("Запуск в режиме разработки (polling)")
@@ -85,11 +150,11 @@ async def main():
             logger.info("Запуск в продакшн режиме (webhook)")
             runner = web.AppRunner(app)
             await runner.setup()
-            site = web.TCPSite(runner, '0.0.0.0', 8000)
+            site = web.TCPSite(runner, settings.WEB_HOST, settings.WEB_PORT)
             await site.start()
             
             # Устанавливаем webhook
-            webhook_url = f"{settings.VK_REDIRECT_URI.replace('/vk-callback', '/webhook')}"
+            webhook_url = get_webhook_url()
             await bot.set_webhook(webhook_url)
             logger.info(f"Webhook установлен: {webhook_url}")
             
@@ -100,9 +165,110 @@ async def main():
         logger.error(f"Ошибка запуска: {e}")
         raise
     finally:
+        if scheduler is not None and scheduler.running:
+            scheduler.shutdown(wait=False)
+        logger.info(f"Статистика кэша VK: {vk_service.cache.stats()}")
+        logger.info(f"Статистика пула БД: {get_pool_stats()}")
+        await user_cache_listener.stop()
+        await activity_tracker.stop()
+        await vk_service.close()
+        export_service.close()
+        chart_service.close()
+        await close_redis()
+        await close_db()
+        logger.info("Приложение остановлено")
+
+async def serve_worker(index: int):
+    """Процесс-воркер: только обработка HTTP, стартовые задачи выполняет супервизор"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    
+    try:
+        if settings.USER_CACHE_NOTIFY:
+            await user_cache_listener.start()
+        await activity_tracker.start()
+        await worker_metrics.start(index)
+        
+        bot, dp, app = await create_combined_app()
+        runner = web.AppRunner(app)
+        await runner.setup()
+        # Все воркеры слушают один порт, ядро распределяет соединения между ними
+        site = web.TCPSite(runner, settings.WEB_HOST, settings.WEB_PORT, reuse_port=True)
+        await site.start()
+        logger.info(f"Воркер {index} запущен на {settings.WEB_HOST}:{settings.WEB_PORT}")
+        
+        await stop.wait()
+        await runner.cleanup()
+    finally:
+        await worker_metrics.stop()
+        await user_cache_listener.stop()
+        await activity_tracker.stop()
+        await vk_service.close()
+        export_service.close()
+        chart_service.close()
+        await close_redis()
+        await close_db()
+        logger.info(f"Воркер {index} остановлен")
+
+def run_worker(index: int):
+    """Точка входа процесса-воркера"""
+    # Свой файл у каждого воркера: ротация одного файла из нескольких процессов небезопасна
+    setup_logging(worker_log_file(index))
+    try:
+        asyncio.run(serve_worker(index))
+    finally:
+        # Процесс multiprocessing завершается через os._exit, atexit не сработает
+        stop_logging()
+
+async def run_supervisor():
+    """Многопроцессный режим: стартовые задачи и планировщик здесь, HTTP - в воркерах"""
+    check_shared_backends()
+    scheduler = None
+    bot = create_bot()
+    try:
+        await migrate()
+        
+        webhook_url = get_webhook_url()
+        await bot.set_webhook(webhook_url)
+        logger.info(f"Webhook установлен: {webhook_url}")
+        
+        # Фоновые задачи выполняются один раз, а не в каждом воркере
+        from app.services.scheduler import setup_scheduler
+        scheduler = setup_scheduler(bot)
+        scheduler.start()
+        
+        logger.info(f"Запуск {settings.WEB_WORKERS} воркеров на порту {settings.WEB_PORT}")
+        from app.web.supervisor import Supervisor
+        await Supervisor(run_worker, settings.WEB_WORKERS, preload=WORKER_PRELOAD).run()
+    finally:
+        if scheduler is not None and scheduler.running:
+            scheduler.shutdown(wait=False)
+        await bot.session.close()
         await vk_service.close()
+        await close_redis()
         await close_db()
         logger.info("Приложение остановлено")
 
+def check_shared_backends():
+    """Предупреждение о состоянии, которое останется локальным для каждого воркера"""
+    local = [
+        name for name, value in (
+            ("RATE_LIMIT_BACKEND", settings.RATE_LIMIT_BACKEND),
+            ("CACHE_BACKEND", settings.CACHE_BACKEND),
+            ("FSM_STORAGE", settings.FSM_STORAGE),
+        )
+        if value != "redis"
+    ]
+    if local:
+        logger.warning(
+            f"{', '.join(local)} не используют Redis: при {settings.WEB_WORKERS} воркерах "
+            f"лимиты, кэш и состояния будут отдельными в каждом процессе"
+        )
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if not settings.DEBUG and settings.WEB_WORKERS > 1:
+        asyncio.run(run_supervisor())
+    else:
+        asyncio.run(main())
\ No newline at end of file